@@ -0,0 +1,185 @@
+import os
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Most records written before the handlers are flushed
+BATCH_SIZE = 256
+# Most records waiting to be written; further ones are dropped (and counted)
+# rather than letting memory grow if the listener falls behind
+MAX_QUEUED = 10000
+
+_STOP = object()
+
+class _BatchFlush:
+    """Handler mixin that leaves flushing to the listener, once per batch"""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+    def close(self):
+        self.flush_batch()
+        super().close()
+
+class BatchedStreamHandler(_BatchFlush, logging.StreamHandler):
+    pass
+
+class BatchedRotatingFileHandler(_BatchFlush, RotatingFileHandler):
+    pass
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that drops records when the listener's queue is full"""
+
+    def __init__(self, listener):
+        super().__init__(listener.queue)
+        self.listener = listener
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.listener.dropped += 1
+
+class LogListener:
+    """
+    Writes queued log records on a background thread.
+
+    Loggers only put records on an in-memory queue, so a ping thread never
+    waits for the console, the disk or a file rotation. The listener takes
+    whatever has queued up (up to ``BATCH_SIZE`` records), hands it to the
+    handlers and flushes them once for the whole batch.
+
+    A handler that fails is reported through its ``handleError`` and the
+    listener carries on; records that do not fit in the queue are dropped
+    and their number logged once there is room again.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, max_queued=MAX_QUEUED):
+        self.queue = queue.Queue(max_queued)
+        self.batch_size = batch_size
+        # Records dropped because the queue was full (counted by the producers)
+        self.dropped = 0
+        self._reported = 0
+        # Replaced, never mutated, so the listener thread can iterate it freely
+        self.handlers = ()
+        self.thread = None
+        self._lock = threading.Lock()
+
+    def add_handler(self, handler):
+        with self._lock:
+            self.handlers = self.handlers + (handler,)
+
+    def start(self):
+        with self._lock:
+            if self.thread is not None and self.thread.is_alive():
+                return False
+            self.thread = threading.Thread(target=self._run, name="keep_alive_logging")
+            self.thread.daemon = True
+            self.thread.start()
+            return True
+
+    def stop(self, timeout=5):
+        """Write everything still queued and stop the thread"""
+        if self.thread is None or not self.thread.is_alive():
+            return False
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return False
+        self.thread.join(timeout)
+        return True
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            dropped = self.dropped
+            if dropped != self._reported:
+                batch.append(logging.makeLogRecord({
+                    "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                    "msg": f"Dropped {dropped - self._reported} log records (queue full)"}))
+                self._reported = dropped
+            handlers = self.handlers
+            for record in batch:
+                if record is _STOP:
+                    stopping = True
+                    continue
+                for handler in handlers:
+                    if record.levelno >= handler.level:
+                        try:
+                            handler.handle(record)
+                        except Exception:
+                            # Any failure (e.g. a closed stream raises
+                            # ValueError) must not stop the listener
+                            handler.handleError(record)
+            for handler in handlers:
+                try:
+                    handler.flush_batch()
+                except Exception:
+                    # e.g. the console went away; keep serving the other handlers
+                    pass
+
+# One listener (and thread) for every logger set up in the process
+_listener = LogListener()
+_file_handlers = {}
+_console_handler = None
+_setup_lock = threading.Lock()
+atexit.register(_listener.stop)
+
+def setup_logging(name, level=logging.INFO, log_file=None):
+    """
+    Route a logger through the shared background listener
+
+    Safe to call any number of times: the logger gets a single queue
+    handler, and the console and each log file get a single writer no
+    matter how many services are set up.
+
+    Args:
+        name (str): Logger name; its child loggers are routed too
+        level: Level of the logger and its handlers (name or number)
+        log_file (str): Rotating log file to write to, if any
+
+    Returns:
+        logging.Logger: The configured logger
+    """
+    global _console_handler
+    formatter = logging.Formatter(LOG_FORMAT)
+    logger = logging.getLogger(name)
+    with _setup_lock:
+        logger.setLevel(level)
+        if _console_handler is None:
+            _console_handler = BatchedStreamHandler()
+            _console_handler.setFormatter(formatter)
+            _listener.add_handler(_console_handler)
+        _console_handler.setLevel(level)
+
+        if log_file:
+            path = os.path.abspath(log_file)
+            handler = _file_handlers.get(path)
+            if handler is None:
+                handler = _file_handlers[path] = BatchedRotatingFileHandler(
+                    path, maxBytes=1024*1024, backupCount=5)
+                handler.setFormatter(formatter)
+                _listener.add_handler(handler)
+            handler.setLevel(level)
+
+        if not any(isinstance(handler, QueueHandler) and handler.queue is _listener.queue
+                   for handler in logger.handlers):
+            logger.addHandler(DroppingQueueHandler(_listener))
+            # The listener writes to the console itself; propagating to the
+            # root logger would print every record a second time, synchronously
+            logger.propagate = False
+    _listener.start()
+    return logger
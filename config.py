@@ -1,5 +1,6 @@
 import os
 import json
+import tempfile
 
 # Default configuration for the keep-alive service
 DEFAULT_CONFIG = {
@@ -18,7 +19,32 @@ DEFAULT_CONFIG = {
         }
     },
     "interval": 180,  # Ping interval in seconds (3 minutes)
+    "adaptive_interval": False,  # Learn the longest interval that keeps the target warm
+    "min_interval": 60,  # Bounds of the adaptive interval in seconds
+    "max_interval": 3600,
+    "adaptive_margin": 0.8,  # Fraction of the learned idle timeout to ping at
     "max_history": 100,  # Maximum number of ping history entries to keep
+    "page_size": 50,  # History entries per dashboard page
+    "sse_max_streams": 4,  # Live dashboard streams per worker before falling back to short polls
+    "response_limit": 1000,  # Bytes of each response body to keep (0 = status only)
+    "phase_spread": False,  # Spread first and later pings over the interval by target id
+    "phase_jitter": 5.0,  # Extra per-process phase offset in seconds (at most 10% of the interval)
+    "max_concurrency": 50,  # Maximum number of pings in flight across all targets
+    "pool_size": 10,  # Kept-alive connections per target host
+    "pool_idle_ttl": 300,  # Seconds before an unused host session is closed
+    # File holding the ping history shared by every worker process ("" = per process)
+    "shared_history_file": os.path.join(tempfile.gettempdir(), "keep_alive_history.bin"),
+    "database_url": "sqlite:///keep_alive.db",  # Durable ping store ("" = memory only)
+    "ping_log_file": "keep_alive_pings.bin",  # Append-only binary log of every ping ("" = off)
+    "ping_log_max_mb": 64,  # Size at which the ping log is rotated (0 = never)
+    "ping_log_backups": 3,  # Rotated ping logs kept
+    "snapshot_file": "keep_alive_snapshot.bin",  # Warm-start snapshot ("" = off)
+    "snapshot_interval": 60,  # Seconds between snapshots
+    "store_batch_size": 500,  # Maximum rows written per store transaction
+    "store_flush_interval": 1.0,  # Seconds results are buffered before writing
+    "raw_retention_days": 7,  # Days raw results are kept before rollup to minutes
+    "minute_retention_days": 30,  # Days minute rollups are kept before rollup to hours
+    "rollup_interval": 3600,  # Seconds between rollup runs
     "log_level": "INFO",
     "log_file": "keep_alive.log"
 }
@@ -83,12 +109,117 @@ def get_config():
         except ValueError:
             pass
     
+    if os.environ.get('ADAPTIVE_INTERVAL'):
+        config['adaptive_interval'] = os.environ.get('ADAPTIVE_INTERVAL').lower() in ('1', 'true', 'yes')
+    
+    if os.environ.get('MIN_INTERVAL'):
+        try:
+            config['min_interval'] = max(1, int(os.environ.get('MIN_INTERVAL')))
+        except ValueError:
+            pass
+    
+    if os.environ.get('MAX_INTERVAL'):
+        try:
+            config['max_interval'] = max(1, int(os.environ.get('MAX_INTERVAL')))
+        except ValueError:
+            pass
+    
+    if os.environ.get('ADAPTIVE_MARGIN'):
+        try:
+            config['adaptive_margin'] = min(1.0, max(0.1, float(os.environ.get('ADAPTIVE_MARGIN'))))
+        except ValueError:
+            pass
+    
     if os.environ.get('MAX_HISTORY'):
         try:
             config['max_history'] = int(os.environ.get('MAX_HISTORY'))
         except ValueError:
             pass
     
+    if os.environ.get('RESPONSE_LIMIT'):
+        try:
+            config['response_limit'] = max(0, int(os.environ.get('RESPONSE_LIMIT')))
+        except ValueError:
+            pass
+    
+    if os.environ.get('MAX_CONCURRENCY'):
+        try:
+            config['max_concurrency'] = max(1, int(os.environ.get('MAX_CONCURRENCY')))
+        except ValueError:
+            pass
+    
+    if os.environ.get('PHASE_SPREAD'):
+        config['phase_spread'] = os.environ.get('PHASE_SPREAD').lower() in ('1', 'true', 'yes')
+    
+    if os.environ.get('PHASE_JITTER'):
+        try:
+            config['phase_jitter'] = max(0.0, float(os.environ.get('PHASE_JITTER')))
+        except ValueError:
+            pass
+    
+    if os.environ.get('POOL_SIZE'):
+        try:
+            config['pool_size'] = max(1, int(os.environ.get('POOL_SIZE')))
+        except ValueError:
+            pass
+    
+    if os.environ.get('POOL_IDLE_TTL'):
+        try:
+            config['pool_idle_ttl'] = float(os.environ.get('POOL_IDLE_TTL'))
+        except ValueError:
+            pass
+    
+    if os.environ.get('LEADER_LOCK_FILE'):
+        config['leader_lock_file'] = os.environ.get('LEADER_LOCK_FILE')
+    
+    if os.environ.get('SHARED_HISTORY_FILE') is not None:
+        config['shared_history_file'] = os.environ.get('SHARED_HISTORY_FILE')
+    
+    if os.environ.get('DATABASE_URL') is not None:
+        config['database_url'] = os.environ.get('DATABASE_URL')
+    
+    if os.environ.get('PING_LOG_FILE') is not None:
+        config['ping_log_file'] = os.environ.get('PING_LOG_FILE')
+    
+    if os.environ.get('PING_LOG_MAX_MB'):
+        try:
+            config['ping_log_max_mb'] = max(0.0, float(os.environ.get('PING_LOG_MAX_MB')))
+        except ValueError:
+            pass
+    
+    if os.environ.get('PING_LOG_BACKUPS'):
+        try:
+            config['ping_log_backups'] = max(0, int(os.environ.get('PING_LOG_BACKUPS')))
+        except ValueError:
+            pass
+    
+    if os.environ.get('SNAPSHOT_FILE') is not None:
+        config['snapshot_file'] = os.environ.get('SNAPSHOT_FILE')
+    
+    if os.environ.get('SNAPSHOT_INTERVAL'):
+        try:
+            config['snapshot_interval'] = max(1.0, float(os.environ.get('SNAPSHOT_INTERVAL')))
+        except ValueError:
+            pass
+    
+    if os.environ.get('STORE_FLUSH_INTERVAL'):
+        try:
+            config['store_flush_interval'] = max(0.0, float(os.environ.get('STORE_FLUSH_INTERVAL')))
+        except ValueError:
+            pass
+    
+    if os.environ.get('RAW_RETENTION_DAYS'):
+        try:
+            config['raw_retention_days'] = max(0.0, float(os.environ.get('RAW_RETENTION_DAYS')))
+        except ValueError:
+            pass
+    
+    if os.environ.get('MINUTE_RETENTION_DAYS'):
+        try:
+            config['minute_retention_days'] = max(0.0, float(os.environ.get('MINUTE_RETENTION_DAYS')))
+        except ValueError:
+            pass
+    
     if os.environ.get('LOG_LEVEL'):
         config['log_level'] = os.environ.get('LOG_LEVEL')
     
@@ -0,0 +1,7 @@
+# Gunicorn settings, picked up automatically from the working directory.
+import os
+
+# Threaded workers, so a dashboard's long-lived event stream (/api/events)
+# occupies one thread instead of a whole worker process
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 16))
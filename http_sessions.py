@@ -0,0 +1,340 @@
+import os
+import ssl
+import time
+import socket
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_CA_BUNDLE_PATH
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import HTTPError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+class ResumingSSLContext(ssl.SSLContext):
+    """
+    SSL context that remembers the last TLS session per host and offers it
+    again on the next handshake, so reconnects use an abbreviated handshake.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._tls_sessions = {}
+
+    def wrap_socket(self, sock, server_side=False, do_handshake_on_connect=True,
+                    suppress_ragged_eofs=True, server_hostname=None, session=None):
+        if session is None and server_hostname and not server_side:
+            session = self._tls_sessions.get(server_hostname)
+        return super().wrap_socket(
+            sock, server_side=server_side,
+            do_handshake_on_connect=do_handshake_on_connect,
+            suppress_ragged_eofs=suppress_ragged_eofs,
+            server_hostname=server_hostname, session=session)
+
+    def remember_session(self, server_hostname, sock):
+        """Store the session of an established TLS socket for later resumption"""
+        session = getattr(sock, 'session', None)
+        if server_hostname and session is not None:
+            self._tls_sessions[server_hostname] = session
+
+def create_ssl_context(ca_file=DEFAULT_CA_BUNDLE_PATH):
+    """Build a verifying client context equivalent to the requests default"""
+    context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.options |= ssl.OP_NO_COMPRESSION
+    context.load_verify_locations(ca_file)
+    return context
+
+class TimedConnectionMixin:
+    """
+    Records how long DNS resolution and the TCP connect took when a new
+    socket is opened. The timings stay on the connection until a ping
+    claims them, so a reused connection reports no setup cost.
+    """
+
+    phase_timings = None
+
+    def _new_conn(self):
+        host = self._dns_host
+        started = time.perf_counter()
+        try:
+            address = socket.getaddrinfo(host, self.port, allowed_gai_family(),
+                                         socket.SOCK_STREAM)[0][4][0]
+        except OSError:
+            address = None  # Let urllib3 raise its own resolution error
+        resolved = time.perf_counter()
+        try:
+            if address is not None:
+                self._dns_host = address
+            try:
+                sock = super()._new_conn()
+            except NewConnectionError:
+                if address is None:
+                    raise
+                # The first address refused; let urllib3 try the others
+                self._dns_host = host
+                sock = super()._new_conn()
+        finally:
+            self._dns_host = host
+        self.phase_timings = {
+            "dns": resolved - started,
+            "connect": time.perf_counter() - resolved,
+            "tls": 0.0,
+            "tls_resumed": False,
+        }
+        return sock
+
+class PooledHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    """Plain HTTP connection used by the session pool"""
+
+class PooledHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    """HTTPS connection that feeds its TLS session back into the shared context"""
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        if self.phase_timings is not None:
+            setup = self.phase_timings["dns"] + self.phase_timings["connect"]
+            self.phase_timings["tls"] = max(0.0, time.perf_counter() - started - setup)
+            self.phase_timings["tls_resumed"] = bool(getattr(self.sock, 'session_reused', False))
+        self._remember_tls_session()
+
+    def close(self):
+        # TLS 1.3 tickets arrive after the handshake, so capture them again here
+        self._remember_tls_session()
+        super().close()
+
+    def _remember_tls_session(self):
+        if isinstance(self.ssl_context, ResumingSSLContext) and self.sock is not None:
+            self.ssl_context.remember_session(self.host, self.sock)
+
+class PooledHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = PooledHTTPConnection
+
+class PooledHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = PooledHTTPSConnection
+
+class PooledAdapter(HTTPAdapter):
+    """Transport adapter that shares SSL contexts and uses pooled connections"""
+
+    def __init__(self, context_for, **kwargs):
+        """
+        Args:
+            context_for (callable): Returns the shared SSL context for a CA file
+        """
+        self.context_for = context_for
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': PooledHTTPConnectionPool,
+            'https': PooledHTTPSConnectionPool,
+        }
+
+    def close(self):
+        # urllib3 2.x only drops its pools on clear(); close their sockets explicitly
+        pools = self.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                pool.close()
+        super().close()
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(
+            request, verify, cert)
+        # Only the common verifying case shares a context; anything else keeps
+        # the per-pool contexts urllib3 builds itself
+        if cert is None and (verify is True or
+                             (isinstance(verify, str) and os.path.isfile(verify))):
+            ca_file = DEFAULT_CA_BUNDLE_PATH if verify is True else verify
+            pool_kwargs.pop('ca_certs', None)
+            pool_kwargs['ssl_context'] = self.context_for(ca_file)
+        return host_params, pool_kwargs
+
+class SessionPool:
+    """
+    Keeps one persistent ``requests.Session`` per host so consecutive pings
+    reuse the same keep-alive connection (and TLS session) instead of paying
+    for DNS, TCP and TLS setup every time.
+    """
+
+    def __init__(self, pool_size=10, idle_ttl=300):
+        """
+        Initialize the session pool
+
+        Args:
+            pool_size (int): Maximum number of kept-alive connections per host
+            idle_ttl (float): Seconds after which an unused host session is closed
+        """
+        self.pool_size = max(1, int(pool_size))
+        self.idle_ttl = idle_ttl
+        self._ssl_contexts = {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+
+    def ssl_context_for(self, ca_file):
+        """Return the shared SSL context (and TLS session cache) for a CA file"""
+        with self._lock:
+            context = self._ssl_contexts.get(ca_file)
+            if context is None:
+                context = self._ssl_contexts[ca_file] = create_ssl_context(ca_file)
+            return context
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = PooledAdapter(self.ssl_context_for, pool_connections=1,
+                                pool_maxsize=self.pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def session_for(self, url):
+        """Return the pooled session for the host of ``url``"""
+        parts = urlsplit(url)
+        key = (parts.scheme.lower(), parts.netloc.lower())
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None:
+                entry = self._sessions[key] = [self._new_session(), now]
+            entry[1] = now
+            stale = self._collect_idle(now)
+        for session in stale:
+            session.close()
+        return entry[0]
+
+    def _collect_idle(self, now):
+        """Remove sessions idle for longer than the TTL (caller holds the lock)"""
+        if not self.idle_ttl or now - self._last_prune < self.idle_ttl / 2:
+            return []
+        self._last_prune = now
+        stale = [key for key, (_, last_used) in self._sessions.items()
+                 if now - last_used > self.idle_ttl]
+        return [self._sessions.pop(key)[0] for key in stale]
+
+    def request(self, method, url, **kwargs):
+        """Send a request through the pooled session for the URL's host"""
+        return self.session_for(url).request(method, url, **kwargs)
+
+    def close(self):
+        """Close every pooled session and its connections"""
+        with self._lock:
+            sessions = [entry[0] for entry in self._sessions.values()]
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+def claim_phase_timings(response):
+    """
+    Take the connection setup timings recorded for a streamed response
+
+    Returns:
+        dict: ``dns``, ``connect`` and ``tls`` durations in seconds plus the
+        ``reused_connection`` and ``tls_resumed`` flags
+    """
+    connection = getattr(response.raw, 'connection', None)
+    timings = getattr(connection, 'phase_timings', None)
+    if timings is None:
+        return {"dns": 0.0, "connect": 0.0, "tls": 0.0,
+                "reused_connection": True, "tls_resumed": False}
+    connection.phase_timings = None
+    return dict(timings, reused_connection=False)
+
+# Errors a ping can end with: requests wraps those raised while sending, but
+# reading a streamed body raises urllib3's own (ProtocolError, ReadTimeoutError)
+PING_ERRORS = (requests.exceptions.RequestException, HTTPError)
+
+def read_capped(response, max_bytes, drain_limit=64 * 1024):
+    """
+    Read at most ``max_bytes`` of a streamed response and release its connection
+
+    A short remainder (up to ``drain_limit`` bytes) is drained so the
+    connection can go back to the pool; anything larger is closed instead of
+    being downloaded. ``max_bytes=0`` checks the status line and headers only.
+
+    Errors while reading the body (``urllib3.exceptions.HTTPError``, e.g. a
+    body cut short or a read timeout) are raised as is; the connection is
+    closed and released either way.
+
+    Returns:
+        tuple: (decoded text, whether the body was truncated)
+    """
+    raw = response.raw
+    # urllib3 refuses to mix decoded and raw reads of one body, so the
+    # remainder is drained the same way the kept part was read
+    decode = max_bytes > 0
+    try:
+        data = raw.read(max_bytes + 1, decode_content=True) if decode else b''
+        truncated = len(data) > max_bytes
+        if truncated:
+            data = data[:max_bytes]
+        if max_bytes <= 0 or truncated:
+            drained = 0
+            while drained <= drain_limit and not raw.isclosed():
+                chunk = raw.read(8192, decode_content=decode)
+                if not chunk:
+                    break
+                drained += len(chunk)
+                truncated = True
+            if not raw.isclosed():
+                # Too much left to be worth downloading; drop the connection
+                raw.close()
+    except BaseException:
+        # A half-read body leaves the connection unusable
+        raw.close()
+        raise
+    finally:
+        raw.release_conn()
+    return data.decode(response.encoding or 'utf-8', errors='replace'), truncated
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+def phase_breakdown(setup, started, headers_at, finished):
+    """
+    Turn ``time.perf_counter()`` marks into a per-phase latency breakdown
+
+    Args:
+        setup (dict): Result of ``claim_phase_timings``
+        started (float): Mark taken just before the request was sent
+        headers_at (float): Mark taken once the response headers arrived
+        finished (float): Mark taken after the body was read
+
+    Returns:
+        dict: Durations in milliseconds for each phase
+    """
+    setup_time = setup["dns"] + setup["connect"] + setup["tls"]
+    return {
+        "dns_ms": _ms(setup["dns"]),
+        "connect_ms": _ms(setup["connect"]),
+        "tls_ms": _ms(setup["tls"]),
+        "ttfb_ms": _ms(max(0.0, headers_at - started - setup_time)),
+        "body_ms": _ms(finished - headers_at),
+        "total_ms": _ms(finished - started),
+        "reused_connection": setup["reused_connection"],
+        "tls_resumed": setup["tls_resumed"],
+    }
+
+# Session pool shared by every ping path in the process
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+def get_session_pool(pool_size=None, idle_ttl=None):
+    """
+    Return the process-wide session pool, creating it on first use
+
+    Args:
+        pool_size (int): Connections per host used when the pool is created
+        idle_ttl (float): Idle timeout used when the pool is created
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = SessionPool(pool_size or 10,
+                                        idle_ttl if idle_ttl is not None else 300)
+        return _default_pool
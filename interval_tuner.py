@@ -0,0 +1,122 @@
+import math
+
+class IntervalTuner:
+    """
+    Learns the longest ping interval that still keeps a target warm.
+
+    Hosts that spin idle services down answer the first request after the
+    sleep with a cold-start latency spike. The tuner keeps a baseline of
+    warm latencies and looks at the gap before every ping:
+
+    - a warm answer after a gap proves the target stays up at least that
+      long, so the interval grows by ``growth`` (never past the known limit);
+    - a cold answer after a gap shows the target falls asleep within it,
+      so that gap becomes the limit and the interval drops to
+      ``margin * limit``.
+
+    The interval therefore backs off towards the host's idle timeout and
+    settles a safety margin below it. A target that later stays warm past
+    the limit (e.g. the host raised its timeout) lifts the limit again.
+    """
+
+    def __init__(self, interval, min_interval=60, max_interval=3600, margin=0.8,
+                 growth=1.25, cold_factor=3.0, cold_min_ms=1000.0, warmup=5):
+        """
+        Args:
+            interval (float): Starting interval in seconds
+            min_interval (float): Shortest interval ever used
+            max_interval (float): Longest interval ever used
+            margin (float): Fraction of the learned limit to ping at
+            growth (float): Factor the interval grows by after a warm ping
+            cold_factor (float): Latency over this multiple of the warm
+                baseline counts as a cold start...
+            cold_min_ms (float): ...if it is also this much above the baseline
+            warmup (int): Warm pings measured before the interval changes
+        """
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.interval = min(max(interval, self.min_interval), self.max_interval)
+        self.margin = margin
+        self.growth = growth
+        self.cold_factor = cold_factor
+        self.cold_min_ms = cold_min_ms
+        self.warmup = warmup
+        # Gap after which the target was seen asleep (None while unknown)
+        self.limit = None
+        # Exponentially weighted mean of log(latency) of warm pings
+        self._log_baseline = None
+        self.warm_samples = 0
+        self.cold_starts = 0
+
+    def set_interval(self, interval):
+        """
+        Continue from an interval set by hand, keeping what was learned
+
+        Returns:
+            float: The interval clamped to the allowed range
+        """
+        self.interval = min(max(interval, self.min_interval), self.max_interval)
+        return self.interval
+
+    def reset(self, interval):
+        """Forget everything learned (e.g. for a new target) and start from ``interval``"""
+        self.limit = None
+        self._log_baseline = None
+        self.warm_samples = 0
+        self.cold_starts = 0
+        return self.set_interval(interval)
+
+    @property
+    def baseline_ms(self):
+        """Typical latency of a warm ping, or None before the first one"""
+        return math.exp(self._log_baseline) if self._log_baseline is not None else None
+
+    def is_cold(self, latency_ms):
+        """Whether a latency looks like a cold start against the warm baseline"""
+        baseline = self.baseline_ms
+        if baseline is None or self.warm_samples < self.warmup:
+            return False
+        return (latency_ms > baseline * self.cold_factor
+                and latency_ms - baseline > self.cold_min_ms)
+
+    def observe(self, gap, latency_ms):
+        """
+        Learn from one ping that got a response
+
+        Args:
+            gap (float): Seconds since the previous ping (None if unknown)
+            latency_ms (float): Total time of the ping
+
+        Returns:
+            float: Interval to use from now on
+        """
+        if latency_ms is None or latency_ms <= 0:
+            return self.interval
+        if self.is_cold(latency_ms):
+            self.cold_starts += 1
+            if gap is not None:
+                self.limit = gap if self.limit is None else min(self.limit, gap)
+                self.interval = max(self.min_interval,
+                                    min(self.interval, self.margin * self.limit))
+            return self.interval
+
+        # Warm: outliers are clipped so one slow answer barely moves the baseline
+        value = math.log(latency_ms)
+        if self._log_baseline is None:
+            self._log_baseline = value
+        else:
+            value = min(value, self._log_baseline + math.log(self.cold_factor))
+            self._log_baseline += 0.1 * (value - self._log_baseline)
+        self.warm_samples += 1
+        if gap is None or self.warm_samples < self.warmup:
+            return self.interval
+        if self.limit is not None and gap >= self.limit:
+            # Stayed warm past the old limit: the host's timeout grew
+            self.limit = None
+        target = self.interval * self.growth
+        if self.limit is not None:
+            target = min(target, self.margin * self.limit)
+        if gap >= self.interval * 0.9:
+            # Only grow on evidence from pings sent at the current interval
+            self.interval = min(self.max_interval, max(self.interval, target))
+        return self.interval
@@ -4,12 +4,13 @@ Standalone keep-alive script that can be run independently of the Flask applicat
 This script continuously pings the Render server to keep it active.
 """
 
-import requests
 import time
-import json
 import logging
 import os
 from datetime import datetime
+from http_sessions import get_session_pool, read_capped, PING_ERRORS
+from request_template import PreparedPing
+from leader import LeaderLock
 
 # Setup logging
 logging.basicConfig(
@@ -38,17 +39,22 @@ DATA = {
 }
 INTERVAL = int(os.environ.get('PING_INTERVAL', 180))  # Default: 3 minutes
 
+# Encode the request once instead of on every ping
+REQUEST = PreparedPing("POST", HEADERS, DATA)
+
 def ping_server():
     """Send a ping request to the server"""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     logger.info(f"[{timestamp}] Pinging server at {URL}")
     
     try:
-        response = requests.post(
-            URL, 
-            headers=HEADERS, 
-            data=json.dumps(DATA),
-            timeout=30
+        response = get_session_pool().request(
+            REQUEST.method,
+            URL,
+            headers=REQUEST.headers,
+            data=REQUEST.body(),
+            timeout=30,
+            stream=True
         )
         
         success = 200 <= response.status_code < 300
@@ -57,16 +63,16 @@ def ping_server():
         else:
             logger.warning(f"[{timestamp}] Ping failed. Status code: {response.status_code}")
             
-        # Only log the first 200 characters of the response to avoid huge logs
-        response_text = response.text[:200]
-        if len(response.text) > 200:
+        # Only download the first 200 bytes of the response to avoid huge logs
+        response_text, truncated = read_capped(response, 200)
+        if truncated:
             response_text += "... (truncated)"
             
         logger.debug(f"Response: {response_text}")
         
         return success
         
-    except requests.exceptions.RequestException as e:
+    except PING_ERRORS as e:
         logger.error(f"[{timestamp}] Error pinging server: {e}")
         return False
 
@@ -74,11 +80,23 @@ if __name__ == "__main__":
     logger.info(f"Starting standalone keep-alive script with interval of {INTERVAL} seconds")
     
     try:
+        # Stand by while the web app (or another copy of this script) is
+        # already pinging from this host
+        leader_lock = LeaderLock(os.environ.get('LEADER_LOCK_FILE'), poll_interval=30)
+        if not leader_lock.try_acquire():
+            logger.info(f"Standing by; pings are handled by PID {leader_lock.holder_pid()}")
+            leader_lock.acquire()
+        
+        # Fire on a fixed cadence so ping duration doesn't shift the schedule
+        next_run = time.monotonic()
         while True:
             ping_server()
-            # Sleep in smaller chunks so it can be interrupted more gracefully
-            for _ in range(int(INTERVAL / 10)):
-                time.sleep(10)
+            next_run += INTERVAL
+            now = time.monotonic()
+            if next_run <= now:
+                # Skip slots that were missed entirely rather than bursting
+                next_run += ((now - next_run) // INTERVAL + 1) * INTERVAL
+            time.sleep(next_run - now)
     except KeyboardInterrupt:
         logger.info("Keep-alive script stopped by user")
     except Exception as e:
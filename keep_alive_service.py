@@ -1,55 +1,311 @@
+import os
+import json
 import requests
 import time
-import json
+import random
+import struct
 import logging
 import threading
 from datetime import datetime
-from logging.handlers import RotatingFileHandler
+from ping_engine import get_engine
+from urllib3.exceptions import ReadTimeoutError, ProtocolError
+from http_sessions import (get_session_pool, claim_phase_timings, phase_breakdown,
+                           read_capped, PING_ERRORS)
+from ping_history import PingHistory
+from ping_stats import PingStats
+from shared_history import SharedPingHistory, encode_entry
+from ping_store import get_store
+from ping_log import get_ping_log
+from snapshot import get_checkpointer
+from latency_sketch import LatencySketch
+from metrics import get_metrics
+from target_config import TargetConfig
+from async_logging import setup_logging
+from scheduler import phase_offset, next_phase_deadline
+from interval_tuner import IntervalTuner
+
+def _outcome(status_code=None, error=None):
+    """Outcome class a ping is counted under in the metrics"""
+    if error is not None:
+        if isinstance(error, (requests.exceptions.Timeout, ReadTimeoutError)):
+            return "timeout"
+        if isinstance(error, (requests.exceptions.ConnectionError, ProtocolError)):
+            return "connection_error"
+        return "error"
+    if 200 <= status_code < 300:
+        return "success"
+    if 400 <= status_code < 500:
+        return "http_4xx"
+    if 500 <= status_code < 600:
+        return "http_5xx"
+    return "http_other"
 
 class KeepAliveService:
-    def __init__(self, config):
+    # Seconds between checks for results recorded by other processes
+    UPDATE_POLL_INTERVAL = 1.0
+    
+    def __init__(self, config, engine=None, sessions=None, store=None, metrics=None,
+                 ping_log=None):
         """
         Initialize the keep-alive service with the provided configuration
         
         Args:
             config (dict): Configuration parameters for the service
+            engine (PingEngine): Engine that schedules the pings; defaults to
+                the shared process-wide engine
+            sessions (SessionPool): Pooled HTTP sessions used for the pings;
+                defaults to the shared process-wide pool
+            store (PingStore): Durable store results are written to; defaults
+                to the store for ``config['database_url']`` (none if unset)
+            metrics (PingMetrics): Counters pings are reported to; defaults to
+                the shared process-wide counters
+            ping_log (PingLog): Binary log every result is appended to;
+                defaults to the log at ``config['ping_log_file']`` (none if unset)
         """
-        self.url = config['url']
-        self.headers = config['headers']
-        self.data = config['data']
-        self.interval = config['interval']
+        # Immutable snapshot, replaced as a whole by update_config
+        self.config = TargetConfig.from_config(config)
+        # Serializes the writers of self.config (and the tuner); readers need no lock
+        self._config_lock = threading.Lock()
         self.running = False
-        self.thread = None
-        self.ping_history = []
+        self.engine = engine or get_engine(config.get('max_concurrency'))
+        self.sessions = sessions or get_session_pool(config.get('pool_size'),
+                                                     config.get('pool_idle_ttl'))
         self.max_history = config.get('max_history', 100)
+        if config.get('shared_history_file'):
+            # Every process on the host reads the same history and counters
+            self.ping_history = SharedPingHistory(config['shared_history_file'],
+                                                  self.max_history)
+            self.stats = self.ping_history.stats
+        else:
+            self.ping_history = PingHistory(self.max_history)
+            self.stats = PingStats()
+        # Only used without a shared history, which carries its own sketch
+        self.latency = LatencySketch()
+        self._history_lock = threading.Lock()
+        self._new_result = threading.Condition()
+        if store is None and config.get('database_url'):
+            store = get_store(config['database_url'],
+                              config.get('store_batch_size'),
+                              config.get('store_flush_interval'))
+        self.store = store
+        if ping_log is None and config.get('ping_log_file'):
+            ping_log = get_ping_log(config['ping_log_file'],
+                                    int(config.get('ping_log_max_mb', 64) * 1024 * 1024),
+                                    config.get('ping_log_backups'))
+        self.ping_log = ping_log
+        self.checkpointer = None
+        if config.get('snapshot_file'):
+            self.checkpointer = get_checkpointer(config['snapshot_file'],
+                                                 config.get('snapshot_interval'))
+            self.checkpointer.add(self)
+        # (next ping as Unix time, interval) restored from a snapshot
+        self._resume = None
+        # Spread pings over the interval by target id instead of firing at start
+        self.phase_spread = bool(config.get('phase_spread', False))
+        # Drawn once, so this process keeps a fixed phase for the target
+        self._phase_jitter = random.uniform(0, config.get('phase_jitter', 5.0))
+        # Learns the longest interval that keeps the target warm
+        self.tuner = None
+        if config.get('adaptive_interval'):
+            self.tuner = IntervalTuner(self.interval,
+                                       config.get('min_interval', 60),
+                                       config.get('max_interval', 3600),
+                                       config.get('adaptive_margin', 0.8))
+        self._last_ping_at = None
+        self.metrics = metrics or get_metrics()
+        # Stop requests without a shared history (which carries its own flag)
+        self._paused = False
+        self._follower = None
+        # Settings this process started with, and the last published ones applied
+        self._startup_settings = self.settings()
+        self._config_seq = 0
         
         # Setup logging
         self._setup_logging(config.get('log_level', logging.INFO), 
                            config.get('log_file', 'keep_alive.log'))
+        self._load_history()
+        # A restarted worker continues with the settings changed from a dashboard
+        self.sync_config()
         
     def _setup_logging(self, log_level, log_file):
-        """Set up the logging configuration"""
-        self.logger = logging.getLogger("keep_alive")
-        self.logger.setLevel(log_level)
+        """Log through the shared background listener (set up only once per file)"""
+        self.logger = setup_logging("keep_alive", log_level, log_file)
+    
+    @property
+    def url(self):
+        return self.config.url
+    
+    @property
+    def name(self):
+        return self.config.name
+    
+    @property
+    def method(self):
+        return self.config.method
+    
+    @property
+    def headers(self):
+        return self.config.headers
+    
+    @property
+    def data(self):
+        return self.config.data
+    
+    @property
+    def interval(self):
+        return self.config.interval
+    
+    @property
+    def response_limit(self):
+        return self.config.response_limit
+    
+    @property
+    def config_version(self):
+        return self.config.version
+    
+    @property
+    def prepared_request(self):
+        return self.config.prepared
+    
+    @property
+    def target_id(self):
+        """Identifier results are stored under (the configured name or the URL)"""
+        return self.name or self.url
+    
+    def _load_history(self):
+        """
+        Fill an empty history with the latest stored results after a restart
         
-        # Console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(log_level)
+        A snapshot restores the history, counters and cadence at once.
+        Without one the store is asked, and the ping log is replayed when
+        there is no store or it holds nothing for this target.
+        """
+        if self.ping_history:
+            return
+        if self._restore_snapshot():
+            return
+        recent = []
+        if self.store is not None:
+            try:
+                recent = self.store.recent(self.target_id, self.max_history)
+            except Exception as e:
+                self.logger.error(f"Error loading stored history: {e}")
+        if not recent and self.ping_log is not None:
+            try:
+                recent = self.ping_log.recent(self.target_id, self.max_history)
+            except (OSError, ValueError) as e:
+                self.logger.error(f"Error replaying ping log: {e}")
+        with self._history_lock, self.ping_history.write_lock():
+            if self.ping_history:
+                return
+            latency = self.latency_sketch()
+            for when, entry in recent:
+                self.ping_history.append(entry)
+                self.stats.record(entry["success"], when)
+                self._add_latency(latency, entry)
+            self._save_latency(latency)
+        if recent:
+            self.logger.info(f"Loaded {len(recent)} stored results for {self.target_id}")
+    
+    def _restore_snapshot(self):
+        """Restore the state saved by the checkpointer; False if there is none"""
+        if self.checkpointer is None:
+            return False
+        try:
+            snapshot = self.checkpointer.restore(self.target_id)
+        except (ValueError, struct.error) as e:
+            self.logger.error(f"Error restoring snapshot: {e}")
+            return False
+        if snapshot is None:
+            return False
+        entries = snapshot["entries"]
+        with self._history_lock, self.ping_history.write_lock():
+            if self.ping_history:
+                return True
+            self.stats.load(snapshot["stats"])
+            for entry in entries:
+                evicted = self.ping_history.append(entry)
+                if evicted is not None:
+                    # The history was saved with a larger capacity
+                    self.stats.evict(evicted["success"])
+            self.latency = snapshot["latency"]
+            self._save_latency(self.latency)
+        if self.tuner is not None and snapshot["interval"] != self.interval:
+            # Keep the interval learned before the restart
+            with self._config_lock:
+                interval = self.tuner.set_interval(snapshot["interval"])
+                self.config = self.config.replace({"interval": interval})
+        self._resume = (snapshot["next_ping"], snapshot["interval"])
+        self.logger.info(f"Restored {len(entries)} results for {self.target_id} from snapshot")
+        return True
+    
+    def checkpoint(self):
+        """
+        State saved in snapshots: history, counters, latency and next ping
         
-        # File handler with rotation
-        file_handler = RotatingFileHandler(
-            log_file, maxBytes=1024*1024, backupCount=5)
-        file_handler.setLevel(log_level)
+        Only copies are taken under the history locks; the entries are
+        encoded once they are released.
+        """
+        with self._history_lock, self.ping_history.read_lock():
+            if isinstance(self.ping_history, SharedPingHistory):
+                # Already packed in the shared file
+                records = self.ping_history.raw_records()
+                entries = None
+            else:
+                entries = list(self.ping_history)
+            stats = self.stats.to_bytes()
+            latency = self.latency_sketch()
+        if entries is not None:
+            records = b"".join(encode_entry(entry.get("seq", 0), entry, 0) for entry in entries)
+        next_ping = None
+        deadline = self.engine.deadline_of(self) if self.running else None
+        if deadline is not None:
+            next_ping = time.time() + deadline - time.monotonic()
+        return {
+            "target": self.target_id,
+            "records": records,
+            "stats": stats,
+            "latency": latency,
+            "next_ping": next_ping,
+            "interval": self.interval,
+        }
+    
+    def _resume_deadline(self):
+        """
+        Monotonic time of the first ping after a restart
         
-        # Formatter
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        console_handler.setFormatter(formatter)
-        file_handler.setFormatter(formatter)
+        Continues the cadence saved in the snapshot. When there is no
+        usable cadence (no snapshot, a changed interval, or a slot missed
+        while the process was down) the first ping waits for the target's
+        phase if spreading is on, so targets restored after a long outage
+        do not all fire at once; otherwise it is sent at once (None).
+        """
+        resume, self._resume = self._resume, None
+        if resume is None:
+            return self._phase_deadline()
+        next_ping, interval = resume
+        now = time.time()
+        if next_ping is None or interval != self.interval or next_ping <= now:
+            return self._phase_deadline()
+        return time.monotonic() + next_ping - now
+    
+    def _phase_deadline(self):
+        """
+        Monotonic time of the target's next phase-spread slot, or None if
+        spreading is off
         
-        # Add handlers
-        self.logger.addHandler(console_handler)
-        self.logger.addHandler(file_handler)
+        Slots are aligned to the Unix epoch at an offset given by a hash of
+        the target id plus this process's jitter (at most a tenth of the
+        interval), so targets and replicas restarted together fire spread
+        across the interval rather than in the same second.
+        """
+        if not self.phase_spread:
+            return None
+        interval = self.interval
+        offset = phase_offset(self.target_id, interval,
+                              min(self._phase_jitter, interval / 10))
+        now = time.time()
+        return time.monotonic() + next_phase_deadline(offset, interval, now) - now
     
     def ping_server(self):
         """
@@ -61,95 +317,219 @@ class KeepAliveService:
             "success": False,
             "status_code": None,
             "response": None,
-            "error": None
+            "error": None,
+            "timings": None
         }
+        started = time.perf_counter()
+        gap = started - self._last_ping_at if self._last_ping_at is not None else None
+        self._last_ping_at = started
+        # One snapshot for the whole ping, even if the config is swapped meanwhile
+        config = self.config
         
         try:
-            self.logger.info(f"Pinging server at {self.url}")
+            self.logger.info(f"Pinging server at {config.url}")
             
-            # Get HTTP method (default to POST for backward compatibility)
-            method = getattr(self, 'method', 'POST').upper()
-            
-            # Prepare request data based on Content-Type and data format
+            # Method, headers and body were prepared when the config was set
+            prepared = config.prepared
             request_kwargs = {
-                'url': self.url,
-                'headers': self.headers,
+                'url': config.url,
+                'headers': prepared.headers,
+                'data': prepared.body(),
                 'timeout': 30
             }
             
-            # Handle data based on method and data type
-            if method != 'GET' and self.data is not None:
-                content_type = self.headers.get('Content-Type', 'application/json')
-                
-                if isinstance(self.data, str):
-                    # String data (form data or plain text)
-                    request_kwargs['data'] = self.data
-                elif isinstance(self.data, dict):
-                    # Dictionary data
-                    if 'application/json' in content_type:
-                        request_kwargs['data'] = json.dumps(self.data)
-                    elif 'application/x-www-form-urlencoded' in content_type:
-                        request_kwargs['data'] = self.data  # requests will handle form encoding
-                    else:
-                        request_kwargs['data'] = json.dumps(self.data)  # Default to JSON
-                else:
-                    # Other data types
-                    request_kwargs['data'] = str(self.data)
-            
-            # Make the request using the specified method
-            response = requests.request(method, **request_kwargs)
+            # Make the request using the specified method; streaming lets us
+            # time the headers separately from the body
+            response = self.sessions.request(prepared.method, stream=True,
+                                             **request_kwargs)
+            headers_at = time.perf_counter()
+            setup = claim_phase_timings(response)
+            body, truncated = read_capped(response, config.response_limit)
+            result["timings"] = phase_breakdown(setup, started, headers_at,
+                                                time.perf_counter())
             
             result["success"] = 200 <= response.status_code < 300
             result["status_code"] = response.status_code
             
-            # Limit response content size to prevent memory issues
-            response_text = response.text[:1000]
-            if len(response.text) > 1000:
+            # Only the first response_limit bytes were downloaded; 0 means
+            # a status-only check
+            response_text = body
+            if truncated and config.response_limit > 0:
                 response_text += "... (truncated)"
                 
-            result["response"] = response_text
+            result["response"] = response_text if config.response_limit > 0 else None
             
             self.logger.info(f"Ping result: Status {response.status_code}")
             if not result["success"]:
                 self.logger.warning(f"Unsuccessful response: {response_text}")
+            outcome = _outcome(response.status_code)
                 
-        except requests.exceptions.RequestException as e:
+        except PING_ERRORS as e:
             result["error"] = str(e)
+            result["timings"] = {"total_ms": round((time.perf_counter() - started) * 1000, 3)}
+            outcome = _outcome(error=e)
             self.logger.error(f"Error pinging server: {e}")
         
-        # Add to history and maintain max size
-        self.ping_history.append(result)
-        if len(self.ping_history) > self.max_history:
-            self.ping_history.pop(0)
+        self._record(result, config)
+        latency = result["timings"]["total_ms"] / 1000 if result["status_code"] is not None else None
+        self.metrics.observe(config.name or config.url, outcome, latency)
+        if isinstance(self.ping_history, SharedPingHistory):
+            self.ping_history.count_ping(outcome, latency)
+        if self.tuner is not None and latency is not None:
+            self._adapt_interval(gap, latency * 1000)
             
         return result
     
-    def _service_loop(self):
-        """Main service loop that runs in a separate thread"""
-        self.logger.info(f"Keep-alive service started. Interval: {self.interval} seconds")
-        
-        while self.running:
+    def _adapt_interval(self, gap, latency_ms):
+        """Let the tuner learn from a ping and apply the interval it settles on"""
+        # Under the config lock, so a concurrent update_config is neither
+        # lost nor undone by a value the tuner learned before it
+        with self._config_lock:
+            cold = self.tuner.is_cold(latency_ms)
+            interval = round(self.tuner.observe(gap, latency_ms), 1)
+            baseline = self.tuner.baseline_ms
+            old = self.config
+            if interval != old.interval:
+                self.config = old.replace({"interval": interval})
+        if cold:
+            self.logger.warning(
+                f"Cold start of {self.target_id} after {gap or 0:.0f}s "
+                f"({latency_ms:.0f} ms vs {baseline:.0f} ms warm)")
+        if interval == old.interval:
+            return
+        self.logger.info(f"Adaptive interval for {self.target_id}: "
+                         f"{old.interval}s -> {interval}s")
+        self.ping_history.touch()
+        self._publish_config({"interval": interval})
+        if self.running:
+            self.engine.reschedule(self, self._phase_deadline())
+    
+    def _record(self, result, config=None):
+        """Add a result to the history and update the running statistics"""
+        when = time.time()
+        if self.store is not None:
+            config = config or self.config
+            self.store.add(config.name or config.url, result, when)
+        with self._history_lock, self.ping_history.write_lock():
+            # The ring buffer evicts the oldest entry when full
+            evicted = self.ping_history.append(result)
+            self.stats.record(result["success"], when)
+            if evicted is not None:
+                self.stats.evict(evicted["success"])
+            latency = self.latency_sketch()
+            if self._add_latency(latency, result):
+                self._save_latency(latency)
+        if self.ping_log is not None:
+            config = config or self.config
             try:
-                self.ping_server()
-                # Sleep in small intervals to allow for cleaner shutdown
-                for _ in range(int(self.interval / 0.5)):
-                    if not self.running:
-                        break
-                    time.sleep(0.5)
-            except Exception as e:
-                self.logger.error(f"Unexpected error in service loop: {e}")
-                time.sleep(5)  # Short delay to prevent rapid error loops
+                self.ping_log.append(config.name or config.url, result, when)
+            except OSError as e:
+                self.logger.error(f"Error writing ping log: {e}")
+        with self._new_result:
+            self._new_result.notify_all()
+    
+    def wait_for_result(self, seq, timeout):
+        """
+        Block until the history holds an entry newer than ``seq``
+        
+        Results recorded in this process wake the caller at once; results
+        written to a shared history by another process are noticed within
+        ``UPDATE_POLL_INTERVAL`` seconds.
+        
+        Returns:
+            int: Sequence number of the newest entry
+        """
+        deadline = time.monotonic() + timeout
+        with self._new_result:
+            while True:
+                newest = self.ping_history.last_seq
+                remaining = deadline - time.monotonic()
+                if newest > seq or remaining <= 0:
+                    return newest
+                self._new_result.wait(min(remaining, self.UPDATE_POLL_INTERVAL))
+    
+    def find_history(self, before=None, limit=50, success=None, status_code=None,
+                     since=None, until=None):
+        """
+        Page through the history, newest first, without copying it
+        
+        Args:
+            before (int): Only entries with a sequence number below this cursor
+            limit (int): Maximum number of entries in the page
+            success (bool): Only successful (True) or failed (False) pings
+            status_code (int): Only pings answered with this status code
+            since (float): Only pings at or after this Unix time
+            until (float): Only pings before this Unix time
+            
+        Returns:
+            tuple: (list of entries, cursor of the next page or None)
+        """
+        # Entry timestamps are local "%Y-%m-%d %H:%M:%S" strings, which sort
+        # chronologically, so the time bounds are compared in that form
+        since_text = (datetime.fromtimestamp(since).strftime("%Y-%m-%d %H:%M:%S")
+                      if since is not None else None)
+        until_text = (datetime.fromtimestamp(until).strftime("%Y-%m-%d %H:%M:%S")
+                      if until is not None else None)
+        page = []
+        for entry in self.ping_history.older_than(before):
+            timestamp = entry["timestamp"]
+            if since_text is not None and timestamp < since_text:
+                break
+            if until_text is not None and timestamp >= until_text:
+                continue
+            if success is not None and entry["success"] != success:
+                continue
+            if status_code is not None and entry["status_code"] != status_code:
+                continue
+            if len(page) == limit:
+                return page, page[-1]["seq"]
+            page.append(entry)
+        return page, None
+    
+    def shared_metrics(self):
+        """
+        Ping counters of this target counted by every process sharing the
+        history, shaped like ``PingMetrics.collect()``; None without one
+        """
+        if not isinstance(self.ping_history, SharedPingHistory):
+            return None
+        return {self.target_id: self.ping_history.ping_counts()}
+    
+    def latency_sketch(self):
+        """Latency sketch of this target (shared by every process using the same history)"""
+        if isinstance(self.ping_history, SharedPingHistory):
+            return self.ping_history.read_sketch()
+        return self.latency
+    
+    def _add_latency(self, latency, result):
+        """Count the total time of a ping that got a response"""
+        timings = result.get("timings")
+        if result.get("status_code") is None or not timings or "total_ms" not in timings:
+            return False
+        latency.add(timings["total_ms"])
+        return True
+    
+    def _save_latency(self, latency):
+        """Publish an updated sketch to the other processes"""
+        if isinstance(self.ping_history, SharedPingHistory):
+            self.ping_history.write_sketch(latency)
+    
+    def clear_history(self):
+        """Remove all history entries"""
+        with self._history_lock, self.ping_history.write_lock():
+            self.ping_history.clear()
+            self.stats.reset_history()
     
     def start(self):
-        """Start the keep-alive service in a background thread"""
+        """Start pinging this target on the shared ping engine"""
         if self.running:
             self.logger.warning("Service is already running")
             return False
             
         self.running = True
-        self.thread = threading.Thread(target=self._service_loop)
-        self.thread.daemon = True  # Allow the program to exit even if the thread is running
-        self.thread.start()
+        self.engine.add_target(self, self._resume_deadline())
+        self._publish_running(True)
+        self.logger.info(f"Keep-alive service started. Interval: {self.interval} seconds")
         return True
     
     def stop(self):
@@ -160,38 +540,210 @@ class KeepAliveService:
             
         self.logger.info("Stopping keep-alive service")
         self.running = False
-        
-        if self.thread and self.thread.is_alive():
-            self.thread.join(timeout=10)  # Wait for thread to terminate
+        self.engine.remove_target(self)
+        self._publish_running(False)
             
         self.logger.info("Keep-alive service stopped")
         return True
     
+    def _publish_running(self, running):
+        """Tell the other processes sharing the history who runs the pings"""
+        if isinstance(self.ping_history, SharedPingHistory):
+            self.ping_history.set_running(running)
+        else:
+            self.ping_history.touch()
+    
+    @property
+    def paused(self):
+        """Whether pinging was stopped on request, possibly through another process"""
+        if isinstance(self.ping_history, SharedPingHistory):
+            return self.ping_history.paused
+        return self._paused
+    
+    def set_paused(self, paused):
+        """
+        Ask the process that leads to stop (True) or resume (False) pinging
+        
+        The leader applies the request within ``UPDATE_POLL_INTERVAL``
+        seconds (see ``follow_requests``), whichever process received it.
+        """
+        if isinstance(self.ping_history, SharedPingHistory):
+            self.ping_history.set_paused(paused)
+        else:
+            self._paused = paused
+            self.ping_history.touch()
+    
+    def follow_requests(self):
+        """
+        Apply stop and resume requests made through any process, in a
+        background thread; run by the leader
+        
+        Returns:
+            bool: False if this process already follows them
+        """
+        if self._follower is not None and self._follower.is_alive():
+            return False
+        self._follower = threading.Thread(target=self._follow, name="keep_alive_follower")
+        self._follower.daemon = True
+        self._follower.start()
+        return True
+    
+    def _follow(self):
+        while True:
+            time.sleep(self.UPDATE_POLL_INTERVAL)
+            try:
+                self.apply_requests()
+            except Exception as e:
+                self.logger.error(f"Error applying shared requests: {e}")
+    
+    def apply_requests(self):
+        """
+        Apply the settings and the running state requested through any process
+        """
+        self.sync_config()
+        paused = self.paused
+        if paused and self.running:
+            self.stop()
+        elif not paused and not self.running:
+            self.start()
+    
     def is_running(self):
         """Check if the service is currently running"""
-        return self.running and self.thread and self.thread.is_alive()
+        return self.running and self.engine.has_target(self)
+    
+    def running_pid(self):
+        """PID of the process pinging this target (possibly another worker), or None"""
+        if self.is_running():
+            return os.getpid()
+        if isinstance(self.ping_history, SharedPingHistory):
+            return self.ping_history.running_pid()
+        return None
     
     def update_config(self, config):
-        """Update service configuration"""
-        if self.running:
-            self.logger.warning("Cannot update configuration while service is running")
-            return False
-            
-        self.url = config.get('url', self.url)
-        self.headers = config.get('headers', self.headers)
-        self.data = config.get('data', self.data)
-        self.interval = config.get('interval', self.interval)
-        self.max_history = config.get('max_history', self.max_history)
+        """
+        Update service configuration, also while the service is running
+        
+        The new settings are published by swapping the config snapshot, so
+        pings in flight finish with the old one and the next ping uses the
+        new one. An interval change moves this target's next deadline in
+        place (to its new phase when spreading); no other target is paused
+        or rescheduled.
         
+        With an adaptive interval, a new URL makes the tuner start learning
+        afresh, and a new interval becomes the value it continues from.
+        
+        With a shared history the changed settings are also published, and
+        every other process (the leader included) applies them within
+        ``UPDATE_POLL_INTERVAL`` seconds or on its next status request.
+        """
+        self._apply_config(config)
+        current = self.settings()
+        self._publish_config({key: value for key, value in current.items() if key in config})
         self.logger.info("Configuration updated")
         return True
+    
+    def _apply_config(self, config):
+        """Swap in a config snapshot with the settings in ``config`` changed"""
+        with self._config_lock:
+            old = self.config
+            new = old.replace(config)
+            if self.tuner is not None:
+                if new.url != old.url:
+                    interval = self.tuner.reset(new.interval)
+                elif new.interval != old.interval:
+                    interval = self.tuner.set_interval(new.interval)
+                else:
+                    interval = new.interval
+                if interval != new.interval:
+                    # Clamped to the tuner's range
+                    new = old.replace(dict(config, interval=interval))
+            self.config = new
+        self.max_history = config.get('max_history', self.max_history)
+        with self._history_lock, self.ping_history.write_lock():
+            for dropped in self.ping_history.resize(self.max_history):
+                self.stats.evict(dropped["success"])
+            self.ping_history.touch()
         
+        if self.config.interval != old.interval and self.running:
+            self.engine.reschedule(self, self._phase_deadline())
+    
+    def settings(self):
+        """Settings a dashboard can change, as currently in effect (plain JSON values)"""
+        config = self.config
+        return json.loads(json.dumps({
+            "url": config.url,
+            "name": config.name,
+            "method": config.method,
+            "headers": dict(config.headers),
+            "data": config.data,
+            "interval": config.interval,
+            "response_limit": config.response_limit,
+            "max_history": self.max_history,
+        }))
+    
+    def _publish_config(self, changes):
+        """Share changed settings with the other processes using the history"""
+        if not isinstance(self.ping_history, SharedPingHistory):
+            return
+        try:
+            self.ping_history.publish_config(changes, self._startup_settings)
+        except (OSError, TypeError, ValueError) as e:
+            self.logger.error(f"Error publishing configuration: {e}")
+    
+    def sync_config(self):
+        """
+        Apply the settings last published by any process, if they changed
+        
+        Settings published by a deployment started with a different
+        configuration are ignored, so editing the configuration and
+        restarting still takes effect.
+        
+        Returns:
+            bool: True if new settings were applied
+        """
+        if not isinstance(self.ping_history, SharedPingHistory):
+            return False
+        if self.ping_history.config_seq == self._config_seq:
+            return False
+        seq, published = self.ping_history.read_config()
+        self._config_seq = seq
+        if not published or published.get("base") != self._startup_settings:
+            return False
+        current = self.settings()
+        changes = {key: value for key, value in published.items()
+                   if key in current and current[key] != value}
+        if not changes:
+            return False
+        self._apply_config(changes)
+        self.logger.info(f"Applied settings published by another process: {sorted(changes)}")
+        return True
+        
+    @property
+    def state_version(self):
+        """
+        Number that grows whenever the history, the configuration or the
+        running state changes (the time-based stats windows aside)
+        
+        With a shared history this is one counter in the shared file, so
+        every process reports the same number for the same state.
+        """
+        return self.ping_history.version
+    
     def get_status(self):
         """Get the current status of the service"""
+        self.sync_config()
+        # A consistent read; other processes' readers are not held up
+        with self._history_lock, self.ping_history.read_lock():
+            stats = self.stats.snapshot()
+            latency = self.latency_sketch().summary()
         return {
-            "running": self.is_running(),
+            "running": self.running_pid() is not None,
             "url": self.url,
             "interval": self.interval,
             "last_ping": self.ping_history[-1] if self.ping_history else None,
-            "history_count": len(self.ping_history)
+            "history_count": len(self.ping_history),
+            "last_seq": self.ping_history.last_seq,
+            "version": self.state_version,
+            "stats": stats,
+            "latency": latency
         }
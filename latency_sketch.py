@@ -0,0 +1,149 @@
+import math
+import struct
+from array import array
+
+# Latencies at or below this value (ms) are counted in a single zero bin
+MIN_VALUE = 1e-3
+
+_HEADER = struct.Struct("<dIQQdddI")
+
+class LatencySketch:
+    """
+    Streaming latency quantile sketch with relative error guarantees (DDSketch).
+
+    Values are counted in logarithmic bins, so any quantile is accurate to
+    within ``relative_accuracy`` of the true value while memory stays bounded
+    by ``max_bins`` (about 1000 bins cover 1 microsecond to 10 days at 1%).
+    Two sketches with the same accuracy merge exactly by adding bin counts,
+    which makes them suitable for combining workers, hosts and rollup windows.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048):
+        """
+        Args:
+            relative_accuracy (float): Maximum relative error of a quantile
+            max_bins (int): Bin limit; the lowest bins are collapsed beyond it
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max(1, int(max_bins))
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return self.count > 0
+
+    def add(self, value, count=1):
+        """Record ``count`` occurrences of a latency ``value`` (ms)"""
+        if value is None or count <= 0:
+            return
+        if value <= MIN_VALUE:
+            self.zero_count += count
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            bins = self.bins
+            bins[key] = bins.get(key, 0) + count
+            if len(bins) > self.max_bins:
+                self._collapse()
+        self.count += count
+        self.sum += value * count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def _collapse(self):
+        """Fold the lowest bins together until the bin limit is respected"""
+        keys = sorted(self.bins)
+        excess = len(keys) - self.max_bins
+        folded = sum(self.bins.pop(key) for key in keys[:excess])
+        self.bins[keys[excess]] += folded
+
+    def merge(self, other):
+        """Add every value counted by another sketch of the same accuracy"""
+        if other._gamma != self._gamma:
+            raise ValueError("Cannot merge sketches with different accuracies")
+        if not other.count:
+            return self
+        bins = self.bins
+        for key, count in other.bins.items():
+            bins[key] = bins.get(key, 0) + count
+        if len(bins) > self.max_bins:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """
+        Estimate the ``q`` quantile (0 <= q <= 1)
+
+        Returns:
+            float: Latency in ms, or None if the sketch is empty
+        """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return max(self.min, 0.0)
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                value = 2 * self._gamma ** key / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self, quantiles=(0.5, 0.95, 0.99)):
+        """Count, mean, extremes and percentiles in ms, e.g. ``{"p95": ...}``"""
+        if not self.count:
+            return {"count": 0}
+        summary = {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 3),
+            "min": round(self.min, 3),
+            "max": round(self.max, 3),
+        }
+        for q in quantiles:
+            summary[f"p{q * 100:g}"] = round(self.quantile(q), 3)
+        return summary
+
+    def to_bytes(self):
+        """Compact binary form, e.g. for storing in a rollup row"""
+        keys = array('i', sorted(self.bins))
+        counts = array('Q', (self.bins[key] for key in keys))
+        return _HEADER.pack(self.relative_accuracy, self.max_bins, self.zero_count,
+                            self.count, self.sum, self.min, self.max,
+                            len(keys)) + keys.tobytes() + counts.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild a sketch from ``to_bytes`` output"""
+        (accuracy, max_bins, zero_count, count, total, low, high,
+         size) = _HEADER.unpack_from(data)
+        sketch = cls(accuracy, max_bins)
+        offset = _HEADER.size
+        keys = array('i')
+        keys.frombytes(data[offset:offset + 4 * size])
+        counts = array('Q')
+        counts.frombytes(data[offset + 4 * size:offset + 12 * size])
+        sketch.bins = dict(zip(keys, counts))
+        sketch.zero_count = zero_count
+        sketch.count = count
+        sketch.sum = total
+        sketch.min = low
+        sketch.max = high
+        return sketch
@@ -0,0 +1,100 @@
+import os
+import fcntl
+import logging
+import tempfile
+import threading
+
+DEFAULT_LOCK_FILE = os.path.join(tempfile.gettempdir(), "keep_alive.lock")
+
+class LeaderLock:
+    """
+    Host-wide leadership held through an exclusive ``flock`` on a lock file.
+
+    Only the process holding the lock runs the ping scheduler. The kernel
+    releases the lock when the holder exits or crashes, so a standby process
+    polling ``try_acquire`` takes over without any cleanup.
+    """
+
+    def __init__(self, path=None, poll_interval=5):
+        """
+        Args:
+            path (str): Lock file shared by every process on the host
+            poll_interval (float): Seconds between takeover attempts
+        """
+        self.path = path or DEFAULT_LOCK_FILE
+        self.poll_interval = poll_interval
+        self.logger = logging.getLogger("keep_alive.leader")
+        self._fd = None
+        self._lock = threading.Lock()
+        self._campaign = None
+        self._stopped = threading.Event()
+
+    @property
+    def is_leader(self):
+        return self._fd is not None
+
+    def try_acquire(self):
+        """Take the lock without blocking; returns True if this process leads"""
+        with self._lock:
+            if self._fd is not None:
+                return True
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+            os.ftruncate(fd, 0)
+            os.write(fd, str(os.getpid()).encode())
+            self._fd = fd
+        self.logger.info(f"Process {os.getpid()} acquired leadership ({self.path})")
+        return True
+
+    def release(self):
+        """Give up leadership and stop any running campaign"""
+        self._stopped.set()
+        with self._lock:
+            if self._fd is None:
+                return False
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        return True
+
+    def holder_pid(self):
+        """PID written by the current leader, or None if unknown"""
+        try:
+            with open(self.path) as f:
+                return int(f.read().strip() or 0) or None
+        except (OSError, ValueError):
+            return None
+
+    def acquire(self):
+        """Block until this process becomes the leader"""
+        while not self.try_acquire():
+            if self._stopped.wait(self.poll_interval):
+                return False
+        return True
+
+    def campaign(self, on_elected):
+        """
+        Try to become leader in the background and call ``on_elected`` once
+
+        Returns immediately; the callback runs on the campaign thread (or
+        synchronously if the lock is free right away).
+        """
+        if self.try_acquire():
+            on_elected()
+            return True
+        if self._campaign is not None and self._campaign.is_alive():
+            return False
+        self.logger.info(f"Standing by; leader is PID {self.holder_pid()}")
+
+        def run():
+            if self.acquire():
+                on_elected()
+
+        self._campaign = threading.Thread(target=run, name="keep_alive_leader")
+        self._campaign.daemon = True
+        self._campaign.start()
+        return False
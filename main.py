@@ -1,8 +1,17 @@
 import os
 import json
+import time
+import base64
 import logging
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from flask import (Flask, Response, render_template, request, jsonify, redirect, url_for,
+                   flash, stream_with_context)
 from keep_alive_service import KeepAliveService
+from leader import LeaderLock
+from rollup import RollupJob
+import metrics
 from config import get_config, save_config
 
 # Setup basic logging
@@ -17,33 +26,53 @@ app.secret_key = os.environ.get("SESSION_SECRET", "dev_secret_key")
 service_config = get_config()
 keep_alive_service = KeepAliveService(service_config)
 
+# Only one process per host (e.g. one gunicorn worker) runs the pings
+leader_lock = LeaderLock(service_config.get('leader_lock_file'))
+
+# Old results are compacted by the leader only
+rollup_job = None
+if keep_alive_service.store is not None:
+    rollup_job = RollupJob(keep_alive_service.store,
+                           service_config.get('raw_retention_days', 7) * 86400,
+                           service_config.get('minute_retention_days', 30) * 86400,
+                           service_config.get('rollup_interval', 3600))
+
+def become_leader():
+    """Start pinging once this process holds the host-wide leader lock"""
+    if not keep_alive_service.paused and not keep_alive_service.is_running():
+        keep_alive_service.start()
+        logger.info(f"Process {os.getpid()} is the leader; keep-alive service started")
+    # Start and stop requests may arrive at any worker; the leader applies them
+    keep_alive_service.follow_requests()
+    if rollup_job is not None:
+        rollup_job.start()
+    # The leader owns the schedule, so it alone saves warm-start snapshots
+    if keep_alive_service.checkpointer is not None:
+        keep_alive_service.checkpointer.start()
+
+# History pages: default size for the dashboard and upper bound for the API
+PAGE_SIZE = service_config.get('page_size', 50)
+MAX_PAGE_SIZE = 500
+
 @app.route('/')
 def index():
     """Render the dashboard"""
     status = keep_alive_service.get_status()
-    history = keep_alive_service.ping_history
-    
-    # Reverse the list to display newest entries first
-    history = list(reversed(history))
+    # One page of the history, newest first; ?before=<seq> shows older pages
+    before = request.args.get('before', type=int)
+    history, older = keep_alive_service.find_history(before=before, limit=PAGE_SIZE)
     
-    # Calculate some basic statistics
-    success_count = sum(1 for entry in keep_alive_service.ping_history if entry.get('success'))
-    failure_count = len(keep_alive_service.ping_history) - success_count
-    
-    if keep_alive_service.ping_history:
-        success_rate = (success_count / len(keep_alive_service.ping_history)) * 100
-    else:
-        success_rate = 0
+    # Statistics are maintained incrementally by the service
+    stats = status['stats']['history']
     
     return render_template('index.html', 
                           status=status, 
                           history=history, 
-                          config=service_config,
-                          stats={
-                              'success_count': success_count,
-                              'failure_count': failure_count,
-                              'success_rate': success_rate
-                          })
+                          older=older,
+                          live=before is None,
+                          page_size=PAGE_SIZE,
+                          config=dict(service_config, **keep_alive_service.settings()),
+                          stats=stats)
 
 @app.route('/api/ping', methods=['POST'])
 def manual_ping():
@@ -53,37 +82,49 @@ def manual_ping():
 
 @app.route('/api/service/start', methods=['POST'])
 def start_service():
-    """Start the keep-alive service"""
-    result = keep_alive_service.start()
-    if result:
+    """Start the keep-alive service (in whichever process leads)"""
+    was_running = keep_alive_service.running_pid() is not None
+    keep_alive_service.set_paused(False)
+    if leader_lock.try_acquire():
+        become_leader()
+    if was_running:
+        flash('Service is already running', 'warning')
+    elif keep_alive_service.is_running():
         flash('Service started successfully', 'success')
     else:
-        flash('Service is already running', 'warning')
+        flash(f'Service start requested; the leader (PID {leader_lock.holder_pid()}) '
+              f'resumes pinging within seconds', 'success')
     return redirect(url_for('index'))
 
 @app.route('/api/service/stop', methods=['POST'])
 def stop_service():
-    """Stop the keep-alive service"""
-    result = keep_alive_service.stop()
-    if result:
+    """Stop the keep-alive service (in whichever process leads)"""
+    was_running = keep_alive_service.running_pid() is not None
+    keep_alive_service.set_paused(True)
+    stopped_here = keep_alive_service.is_running() and keep_alive_service.stop()
+    if not was_running:
+        flash('Service is not running', 'warning')
+    elif stopped_here:
         flash('Service stopped successfully', 'success')
     else:
-        flash('Service is not running', 'warning')
+        flash(f'Service stop requested; the leader (PID {leader_lock.holder_pid()}) '
+              f'stops pinging within seconds', 'success')
     return redirect(url_for('index'))
 
 @app.route('/api/config', methods=['POST'])
 def update_config():
     """Update the service configuration"""
-    # Stop the service before updating config
-    was_running = keep_alive_service.is_running()
-    if was_running:
-        keep_alive_service.stop()
-    
     # Get the form data
     try:
         new_config = service_config.copy()
         new_config['url'] = request.form.get('url', service_config['url'])
-        new_config['interval'] = int(request.form.get('interval', service_config['interval']))
+        # Only an interval the user edited replaces the one in effect, which
+        # the adaptive tuner may have changed since the form was rendered
+        interval = float(request.form.get('interval', service_config['interval']))
+        if interval != request.form.get('interval_shown', type=float):
+            new_config['interval'] = int(interval) if interval.is_integer() else interval
+        else:
+            del new_config['interval']
         
         # Handle HTTP method
         new_config['method'] = request.form.get('method', service_config.get('method', 'POST')).upper()
@@ -120,19 +161,15 @@ def update_config():
             new_config['data'] = service_config.get('data')
         
         # Ensure interval is at least 60 seconds
-        if new_config['interval'] < 60:
+        if new_config.get('interval', 60) < 60:
             new_config['interval'] = 60
             flash('Interval set to minimum value of 60 seconds', 'warning')
         
-        # Update the service config
+        # Swap in the new config; a running service picks it up on its next ping
         keep_alive_service.update_config(new_config)
         
         # Save the configuration
-        save_config(new_config)
-        
-        # Restart if it was running before
-        if was_running:
-            keep_alive_service.start()
+        save_config(dict(new_config, interval=keep_alive_service.interval))
             
         flash('Configuration updated successfully', 'success')
     except Exception as e:
@@ -144,32 +181,317 @@ def update_config():
 @app.route('/api/history/clear', methods=['POST'])
 def clear_history():
     """Clear the ping history"""
-    keep_alive_service.ping_history = []
+    keep_alive_service.clear_history()
     flash('Ping history cleared', 'success')
     return redirect(url_for('index'))
 
+def _parse_time(value):
+    """Unix time from a query parameter given in seconds or as an ISO 8601 date"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def _history_filters(args):
+    """Page size and filters of a history query; raises ValueError if invalid"""
+    limit = int(args.get('limit', PAGE_SIZE))
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    success = args.get('success')
+    if success is not None:
+        if success.lower() not in ('true', 'false', '1', '0'):
+            raise ValueError("success must be true or false")
+        success = success.lower() in ('true', '1')
+    status_code = args.get('status_code')
+    return {
+        "limit": limit,
+        "success": success,
+        "status_code": int(status_code) if status_code is not None else None,
+        "since": _parse_time(args.get('since')),
+        "until": _parse_time(args.get('until')),
+    }
+
+# Serialized JSON payloads by URL, reused until the service state changes
+_payload_cache = OrderedDict()
+_payload_cache_lock = threading.Lock()
+PAYLOAD_CACHE_SIZE = 128
+
+def _state_etag():
+    """
+    Strong ETag covering everything the JSON endpoints report: the service
+    state version and newest sequence number, the current minute (the stats
+    windows roll over once a minute) and which processes are pinging and
+    leading. With a shared history every part is the same in each worker,
+    so a client balanced across workers never gets a 304 for another state.
+    """
+    parts = (keep_alive_service.state_version,
+             keep_alive_service.ping_history.last_seq + 1,
+             int(time.time() // 60),
+             keep_alive_service.running_pid(),
+             leader_lock.holder_pid())
+    return "-".join(str(part or 0) for part in parts)
+
+def _cached_json(build):
+    """
+    Serve the payload returned by ``build()`` with a strong ETag
+
+    A matching If-None-Match is answered with 304 before anything is built,
+    and the serialized body is reused until the ETag changes. ``build`` may
+    return a ``(response, status)`` tuple for errors, which is not cached.
+    """
+    etag = _state_etag()
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        key = request.full_path
+        with _payload_cache_lock:
+            cached = _payload_cache.get(key)
+            if cached is not None and cached[0] == etag:
+                _payload_cache.move_to_end(key)
+        if cached is not None and cached[0] == etag:
+            body = cached[1]
+        else:
+            payload = build()
+            if isinstance(payload, tuple):
+                return payload
+            body = app.json.dumps(payload) + "\n"
+            with _payload_cache_lock:
+                _payload_cache[key] = (etag, body)
+                _payload_cache.move_to_end(key)
+                while len(_payload_cache) > PAYLOAD_CACHE_SIZE:
+                    _payload_cache.popitem(last=False)
+        response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Let clients keep the payload but revalidate it on every poll
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """
+    Page through ping results, newest first
+
+    Query parameters: ``limit``, ``cursor`` (the ``next_cursor`` of the
+    previous page), ``success``, ``status_code``, ``since``/``until`` (Unix
+    seconds or ISO 8601) and ``target``. Other targets are read from the
+    durable store; the state ETag does not cover the store, so those pages
+    are always built afresh.
+    """
+    target = request.args.get('target', keep_alive_service.target_id)
+    if target != keep_alive_service.target_id:
+        return _history_page()
+    return _cached_json(_history_page)
+
+def _history_page():
+    try:
+        filters = _history_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    target = request.args.get('target', keep_alive_service.target_id)
+    cursor = request.args.get('cursor')
+    
+    if target == keep_alive_service.target_id:
+        try:
+            before = int(cursor) if cursor else None
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+        entries, next_cursor = keep_alive_service.find_history(before=before, **filters)
+    elif keep_alive_service.store is not None:
+        try:
+            entries, next_cursor = keep_alive_service.store.query(target, cursor=cursor, **filters)
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+    else:
+        return jsonify({"error": f"Unknown target: {target}"}), 404
+    
+    return {
+        "target": target,
+        "entries": entries,
+        "next_cursor": str(next_cursor) if next_cursor is not None else None
+    }
+
+# Default span of /api/rollups, in days
+ROLLUP_DAYS = 30
+
+@app.route('/api/rollups', methods=['GET'])
+def get_rollups():
+    """
+    Per-minute or per-hour aggregates of a target from the durable store
+
+    Combines the hourly and minute rollups with the raw results not rolled
+    up yet, so any span can be read in one call. Query parameters:
+    ``target``, ``since``/``until`` (Unix seconds or ISO 8601; the last
+    ``ROLLUP_DAYS`` days by default) and ``resolution`` (``minute`` or
+    ``hour``, the default).
+    """
+    store = keep_alive_service.store
+    if store is None:
+        return jsonify({"error": "No durable store is configured"}), 404
+    resolution = request.args.get('resolution', 'hour')
+    if resolution not in ('minute', 'hour'):
+        return jsonify({"error": "resolution must be minute or hour"}), 400
+    try:
+        since = _parse_time(request.args.get('since'))
+        until = _parse_time(request.args.get('until'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if since is None:
+        since = (until or time.time()) - ROLLUP_DAYS * 86400
+    target = request.args.get('target', keep_alive_service.target_id)
+    return jsonify({
+        "target": target,
+        "resolution": resolution,
+        "since": since,
+        "until": until,
+        "buckets": store.rollups(target, since, until, resolution)
+    })
+
 @app.route('/api/status', methods=['GET'])
 def get_status():
     """Get the current service status"""
+    def build():
+        status = keep_alive_service.get_status()
+        status['leader_pid'] = leader_lock.holder_pid()
+        return status
+    return _cached_json(build)
+
+@app.route('/api/latency', methods=['GET'])
+def get_latency():
+    """
+    Latency percentiles of the target, plus the encoded sketch so that
+    results from several workers or hosts can be merged exactly
+    """
+    try:
+        quantiles = [float(q) for q in request.args.get('quantiles', '0.5,0.95,0.99').split(',')]
+    except ValueError:
+        return jsonify({"error": "quantiles must be a comma-separated list of numbers"}), 400
+    if not all(0 <= q <= 1 for q in quantiles):
+        return jsonify({"error": "quantiles must be between 0 and 1"}), 400
+    
+    def build():
+        sketch = keep_alive_service.latency_sketch()
+        return {
+            "target": keep_alive_service.target_id,
+            "latency": sketch.summary(quantiles),
+            "sketch": base64.b64encode(sketch.to_bytes()).decode('ascii')
+        }
+    return _cached_json(build)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Ping counters and scheduler health in the OpenMetrics text format"""
+    # Any worker may answer a scrape: the ping counters come from the shared
+    # history, and the per-process scheduler and store figures are only
+    # reported by the leader, so no series appears to reset between workers
+    leader = leader_lock.is_leader
+    body = metrics.render(keep_alive_service.metrics,
+                          keep_alive_service.engine if leader else None,
+                          keep_alive_service.store if leader else None,
+                          keep_alive_service.shared_metrics())
+    return Response(body, content_type=metrics.CONTENT_TYPE)
+
+# Server-Sent Events settings: a stream ends after SSE_MAX_DURATION seconds and
+# the browser reconnects (resuming from Last-Event-ID) after SSE_RETRY_MS
+SSE_MAX_DURATION = 300
+SSE_HEARTBEAT = 15
+SSE_RETRY_MS = 3000
+SSE_MAX_BACKLOG = 100
+# Each stream holds a worker thread for SSE_MAX_DURATION; beyond this many per
+# process, clients get short polls instead (wait at most SSE_POLL_WAIT seconds,
+# reconnect after SSE_POLL_RETRY_MS) so threads stay free for other requests
+SSE_MAX_STREAMS = service_config.get('sse_max_streams', 4)
+SSE_POLL_WAIT = 2
+SSE_POLL_RETRY_MS = 10000
+_sse_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+def _sse(event, data, event_id=None):
+    """Format one Server-Sent Event"""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(data, separators=(',', ':')))
+    return "\n".join(lines) + "\n\n"
+
+def _live_status():
+    """Status fields shown on the dashboard (the newest entry is sent as a ping event)"""
     status = keep_alive_service.get_status()
-    return jsonify(status)
+    status.pop('last_ping', None)
+    return status
+
+@app.route('/api/events', methods=['GET'])
+def events():
+    """
+    Stream new ping results and status changes to the dashboard
+
+    Sends a ``ping`` event per new history entry (its id is the entry's
+    sequence number, so a reconnecting browser resumes via Last-Event-ID)
+    and a ``status`` event holding only the fields that changed. Once
+    SSE_MAX_STREAMS streams are open, the response ends after one short wait.
+    """
+    history = keep_alive_service.ping_history
+    cursor = request.headers.get('Last-Event-ID', request.args.get('since'))
+    try:
+        cursor = int(cursor)
+    except (TypeError, ValueError):
+        cursor = history.last_seq
+
+    def stream():
+        # Taken inside the generator, so it is released whenever the
+        # response is closed, also if the client goes away
+        streaming = _sse_slots.acquire(blocking=False)
+        try:
+            seq = cursor
+            yield f"retry: {SSE_RETRY_MS if streaming else SSE_POLL_RETRY_MS}\n\n"
+            if seq > history.last_seq:
+                # The history was recreated (e.g. after a restart); start over
+                yield _sse("reset", {"last_seq": history.last_seq})
+                return
+            sent = {}
+            wait = SSE_HEARTBEAT if streaming else SSE_POLL_WAIT
+            ends_at = time.monotonic() + SSE_MAX_DURATION
+            while True:
+                newest = keep_alive_service.wait_for_result(seq, wait)
+                pinged = newest > seq
+                if pinged:
+                    for entry in history.since(seq, SSE_MAX_BACKLOG):
+                        yield _sse("ping", entry, entry["seq"])
+                    seq = newest
+                status = _live_status()
+                delta = {key: value for key, value in status.items() if sent.get(key) != value}
+                if delta:
+                    sent.update(delta)
+                    yield _sse("status", delta)
+                elif not pinged:
+                    # Comment line; keeps proxies from closing an idle stream
+                    yield ": heartbeat\n\n"
+                if not streaming or time.monotonic() >= ends_at:
+                    break
+        finally:
+            if streaming:
+                _sse_slots.release()
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # Flag to track if service has been started
 service_started = False
 
-# Set up an initialization function to start the service on first request
+# Set up an initialization function to start the service on first request.
+# Workers that lose the election keep campaigning and take over if the
+# leader exits.
 @app.before_request
 def start_service_on_startup():
     global service_started
-    if not service_started and not keep_alive_service.is_running():
-        keep_alive_service.start()
+    if not service_started:
         service_started = True
-        logger.info("Keep-alive service started automatically on application startup")
+        leader_lock.campaign(on_elected=become_leader)
 
 if __name__ == "__main__":
-    # Start the service before starting the web server
-    if not keep_alive_service.is_running():
-        keep_alive_service.start()
+    # Start the service before starting the web server (if elected)
+    service_started = True
+    leader_lock.campaign(on_elected=become_leader)
     
     # Start the Flask app
     app.run(host="0.0.0.0", port=5000, debug=True)
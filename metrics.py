@@ -0,0 +1,190 @@
+import threading
+from bisect import bisect_left
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+# Ping outcomes counted per target
+OUTCOMES = ("success", "http_4xx", "http_5xx", "http_other", "timeout",
+            "connection_error", "error")
+
+class Histogram:
+    """
+    Bucketed histogram updated by a single thread.
+
+    Other threads may read it at any time; they see a consistent enough
+    view for monitoring without the writer ever taking a lock.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+class _TargetCounters:
+    """Outcome counts and latency histogram of one target in one thread"""
+
+    def __init__(self, buckets):
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.latency = Histogram(buckets)
+
+class PingMetrics:
+    """
+    Per-target ping counters sharded by thread.
+
+    Each worker thread updates its own shard, so recording a ping never
+    takes a lock or contends with other pings; shards are only summed when
+    the metrics are scraped.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def observe(self, target, outcome, latency=None):
+        """
+        Count one ping
+
+        Args:
+            target (str): Target identifier
+            outcome (str): One of ``OUTCOMES``
+            latency (float): Total time of the ping in seconds, if it got a response
+        """
+        shard = self._shard()
+        counters = shard.get(target)
+        if counters is None:
+            counters = shard[target] = _TargetCounters(self.buckets)
+        counters.outcomes[outcome] += 1
+        if latency is not None:
+            counters.latency.observe(latency)
+
+    def collect(self):
+        """
+        Sum the shards of every thread
+
+        Returns:
+            dict: target -> {"outcomes": {...}, "buckets": [...], "sum": float}
+        """
+        with self._shards_lock:
+            shards = list(self._shards)
+        totals = {}
+        for shard in shards:
+            # dict.copy() runs without releasing the GIL, so it is safe
+            # against the owning thread adding a target meanwhile
+            for target, counters in shard.copy().items():
+                total = totals.get(target)
+                if total is None:
+                    total = totals[target] = {
+                        "outcomes": dict.fromkeys(OUTCOMES, 0),
+                        "buckets": [0] * (len(self.buckets) + 1),
+                        "sum": 0.0,
+                    }
+                for outcome, count in counters.outcomes.items():
+                    total["outcomes"][outcome] += count
+                for i, count in enumerate(counters.latency.counts):
+                    total["buckets"][i] += count
+                total["sum"] += counters.latency.sum
+        return totals
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _histogram(lines, name, buckets, counts, total, **labels):
+    """Append the cumulative bucket, count and sum samples of a histogram"""
+    running = 0
+    for bound, count in zip(tuple(buckets) + (float("inf"),), counts):
+        running += count
+        lines.append(f"{name}_bucket{_labels(**labels, le=_number(float(bound)))} {running}")
+    lines.append(f"{name}_count{_labels(**labels)} {running}")
+    lines.append(f"{name}_sum{_labels(**labels)} {_number(float(total))}")
+
+def render(ping_metrics, engine=None, store=None, shared=None):
+    """
+    Render the metrics in the OpenMetrics text format
+
+    Args:
+        ping_metrics (PingMetrics): Per-target ping counters
+        engine (PingEngine): Scheduler to report lag and queue depth for
+        store (PingStore): Durable store to report dropped writes for
+        shared (dict): Per-target totals kept across processes, which
+            replace this process's own counters for those targets
+    """
+    lines = []
+    targets = ping_metrics.collect()
+    targets.update(shared or {})
+
+    lines.append("# TYPE keepalive_pings counter")
+    lines.append("# HELP keepalive_pings Pings sent, by target and outcome.")
+    for target, total in targets.items():
+        for outcome, count in total["outcomes"].items():
+            lines.append(f"keepalive_pings_total{_labels(target=target, outcome=outcome)} {count}")
+
+    lines.append("# TYPE keepalive_ping_latency_seconds histogram")
+    lines.append("# UNIT keepalive_ping_latency_seconds seconds")
+    lines.append("# HELP keepalive_ping_latency_seconds Total time of pings that got a response.")
+    for target, total in targets.items():
+        _histogram(lines, "keepalive_ping_latency_seconds", ping_metrics.buckets,
+                   total["buckets"], total["sum"], target=target)
+
+    if engine is not None:
+        state = engine.metrics()
+        lines.append("# TYPE keepalive_scheduled_targets gauge")
+        lines.append("# HELP keepalive_scheduled_targets Targets scheduled in this process.")
+        lines.append(f"keepalive_scheduled_targets {state['targets']}")
+        lines.append("# TYPE keepalive_pings_in_flight gauge")
+        lines.append("# HELP keepalive_pings_in_flight Pings currently being sent.")
+        lines.append(f"keepalive_pings_in_flight {state['in_flight']}")
+        lines.append("# TYPE keepalive_pings_queued gauge")
+        lines.append("# HELP keepalive_pings_queued Due pings waiting for a free worker.")
+        lines.append(f"keepalive_pings_queued {state['queued']}")
+        lines.append("# TYPE keepalive_skipped_slots counter")
+        lines.append("# HELP keepalive_skipped_slots Slots skipped because the previous ping was still running.")
+        lines.append(f"keepalive_skipped_slots_total {state['skipped']}")
+        lines.append("# TYPE keepalive_scheduler_lag_seconds histogram")
+        lines.append("# UNIT keepalive_scheduler_lag_seconds seconds")
+        lines.append("# HELP keepalive_scheduler_lag_seconds Delay between a ping's deadline and its dispatch.")
+        lag = state["lag"]
+        _histogram(lines, "keepalive_scheduler_lag_seconds", lag.buckets, list(lag.counts), lag.sum)
+
+    if store is not None:
+        lines.append("# TYPE keepalive_store_dropped_results counter")
+        lines.append("# HELP keepalive_store_dropped_results Results that could not be written to the store.")
+        lines.append(f"keepalive_store_dropped_results_total {store.dropped}")
+
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+# Counters shared by every KeepAliveService in the process
+_default_metrics = PingMetrics()
+
+def get_metrics():
+    """Return the process-wide ping counters"""
+    return _default_metrics
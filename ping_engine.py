@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from scheduler import TimerHeap, next_deadline_after
+from metrics import Histogram, LAG_BUCKETS
+
+class PingEngine:
+    """
+    Runs the keep-alive pings of many targets on a single asyncio event loop.
+
+    Deadlines for every target live in one min-heap keyed on the loop's
+    monotonic clock, and a single loop timer is armed for the earliest one,
+    so the engine only wakes up when a ping is actually due. Each target
+    fires on an absolute cadence (``first deadline + k * interval``), so
+    ping duration never shifts the schedule.
+
+    The blocking HTTP call is handed to a fixed-size worker pool guarded by a
+    semaphore, so the number of threads stays constant no matter how many
+    targets are added.
+    """
+
+    def __init__(self, max_concurrency=50):
+        """
+        Initialize the engine (the event loop is started lazily)
+
+        Args:
+            max_concurrency (int): Maximum number of pings in flight at once
+        """
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.logger = logging.getLogger("keep_alive.engine")
+        self.loop = None
+        self.thread = None
+        self._executor = None
+        self._semaphore = None
+        self._timers = TimerHeap()
+        self._timer_handle = None
+        self._targets = {}
+        # Interval each target's pending deadline was booked with
+        self._intervals = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        # Health counters, only written from the loop thread
+        self.lag = Histogram(LAG_BUCKETS)
+        self.skipped = 0
+        self._queued = 0
+
+    def is_running(self):
+        """Check if the event loop thread is alive"""
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """Start the event loop in a background thread"""
+        with self._lock:
+            if self.is_running():
+                return False
+            self._ready.clear()
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency, thread_name_prefix="keep_alive_ping")
+            self.thread = threading.Thread(target=self._run_loop, name="keep_alive_engine")
+            self.thread.daemon = True
+            self.thread.start()
+        self._ready.wait()
+        self.logger.info(f"Ping engine started (max concurrency: {self.max_concurrency})")
+        return True
+
+    def stop(self, timeout=10):
+        """Cancel all targets and stop the event loop"""
+        if not self.is_running():
+            return False
+        future = asyncio.run_coroutine_threadsafe(self._cancel_all(), self.loop)
+        try:
+            future.result(timeout=timeout)
+        except Exception as e:
+            self.logger.error(f"Error cancelling targets: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=timeout)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.logger.info("Ping engine stopped")
+        return True
+
+    def add_target(self, service, first_deadline=None):
+        """
+        Start pinging a target on the shared loop
+
+        Args:
+            service: Object exposing ``ping_server()`` and ``interval``
+            first_deadline (float): Monotonic time of the first ping
+                (defaults to immediately)
+        """
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(
+            self._add(service, first_deadline), self.loop)
+        return future.result()
+
+    def remove_target(self, service, timeout=10):
+        """Stop pinging a target, waiting for an in-flight ping to be cancelled"""
+        if not self.is_running():
+            return False
+        future = asyncio.run_coroutine_threadsafe(self._remove(service), self.loop)
+        return future.result(timeout=timeout)
+
+    def reschedule(self, service, deadline=None):
+        """
+        Apply a changed ``service.interval`` to the pending deadline
+
+        The next ping moves to ``deadline`` if given, otherwise to the
+        previous slot plus the new interval (or fires at once if that time
+        has already passed); other targets are untouched and nothing waits
+        for the loop.
+        """
+        if self.is_running():
+            self.loop.call_soon_threadsafe(self._reschedule, id(service), deadline)
+
+    def deadline_of(self, service):
+        """Monotonic time of a target's next scheduled ping, or None"""
+        return self._timers.deadline_of(id(service))
+
+    def has_target(self, service):
+        """Check if a target is currently scheduled"""
+        with self._lock:
+            return id(service) in self._targets
+
+    def target_count(self):
+        """Number of targets currently scheduled"""
+        with self._lock:
+            return len(self._targets)
+
+    def metrics(self):
+        """Scheduler health: targets, pings in flight and queued, skipped slots, lag"""
+        return {
+            "targets": self.target_count(),
+            "in_flight": len(self._inflight) - self._queued,
+            "queued": self._queued,
+            "skipped": self.skipped,
+            "lag": self.lag,
+        }
+
+    def _run_loop(self):
+        """Body of the event loop thread"""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def _arm(self):
+        """Point the single loop timer at the earliest pending deadline"""
+        deadline = self._timers.next_deadline()
+        handle = self._timer_handle
+        if handle is not None:
+            if deadline is not None and handle.when() == deadline:
+                return
+            handle.cancel()
+            self._timer_handle = None
+        if deadline is not None:
+            self._timer_handle = self.loop.call_at(deadline, self._on_timer)
+
+    def _on_timer(self):
+        """Fire every target whose deadline has passed, then re-arm"""
+        self._timer_handle = None
+        now = self.loop.time()
+        for key, deadline in self._timers.pop_due(now):
+            service = self._targets.get(key)
+            if service is None:
+                continue
+            self.lag.observe(now - deadline)
+            # Book the next slot before pinging so ping time never adds drift
+            interval = service.interval
+            self._timers.schedule(key, next_deadline_after(deadline, interval, now))
+            self._intervals[key] = interval
+            if key in self._inflight:
+                self.skipped += 1
+                self.logger.warning(
+                    f"Previous ping to {service.url} still running; skipping this slot")
+                continue
+            self._inflight[key] = self.loop.create_task(self._fire(key, service))
+        self._arm()
+
+    async def _add(self, service, first_deadline):
+        key = id(service)
+        with self._lock:
+            if key in self._targets:
+                return False
+            self._targets[key] = service
+        self._timers.schedule(key, first_deadline if first_deadline is not None
+                              else self.loop.time())
+        self._intervals[key] = service.interval
+        self._arm()
+        return True
+
+    def _reschedule(self, key, new_deadline=None):
+        service = self._targets.get(key)
+        deadline = self._timers.deadline_of(key)
+        if service is None or deadline is None:
+            return
+        interval = service.interval
+        booked = self._intervals.get(key, interval)
+        if interval == booked:
+            return
+        if new_deadline is None:
+            new_deadline = deadline - booked + interval
+        self._timers.schedule(key, max(new_deadline, self.loop.time()))
+        self._intervals[key] = interval
+        self._arm()
+
+    async def _remove(self, service):
+        key = id(service)
+        with self._lock:
+            if self._targets.pop(key, None) is None:
+                return False
+        self._timers.cancel(key)
+        self._intervals.pop(key, None)
+        self._arm()
+        task = self._inflight.pop(key, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        return True
+
+    async def _cancel_all(self):
+        with self._lock:
+            keys = list(self._targets)
+            self._targets.clear()
+        for key in keys:
+            self._timers.cancel(key)
+        self._intervals.clear()
+        self._arm()
+        tasks = list(self._inflight.values())
+        self._inflight.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _ping(self, service):
+        """Run one blocking ping on the worker pool, bounded by the semaphore"""
+        self._queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._queued -= 1
+        try:
+            return await self.loop.run_in_executor(self._executor, service.ping_server)
+        finally:
+            self._semaphore.release()
+
+    async def _fire(self, key, service):
+        """Run a single scheduled ping"""
+        try:
+            await self._ping(service)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Unexpected error in service loop: {e}")
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+# Shared engine used by every KeepAliveService in the process
+_default_engine = None
+_default_engine_lock = threading.Lock()
+
+def get_engine(max_concurrency=None):
+    """
+    Return the process-wide ping engine, creating it on first use
+
+    Args:
+        max_concurrency (int): Concurrency limit used when the engine is created
+    """
+    global _default_engine
+    with _default_engine_lock:
+        if _default_engine is None:
+            _default_engine = PingEngine(max_concurrency or 50)
+        return _default_engine
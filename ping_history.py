@@ -0,0 +1,142 @@
+from contextlib import nullcontext
+
+class PingHistory:
+    """
+    Fixed-capacity ring buffer of ping results.
+
+    Appending and evicting are O(1); indexing follows list semantics with
+    index 0 being the oldest entry and -1 the newest. Every appended entry is
+    stamped with an ever-increasing ``seq`` number that clients can use as a
+    cursor.
+    """
+
+    def __init__(self, capacity=100):
+        """
+        Initialize an empty history
+
+        Args:
+            capacity (int): Maximum number of entries kept
+        """
+        self.capacity = max(1, int(capacity))
+        self._items = [None] * self.capacity
+        self._start = 0
+        self._size = 0
+        self._next_seq = 0
+        # Bumped by every change, e.g. to validate cached renderings
+        self.version = 0
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    def _slot(self, index):
+        """Map a logical (oldest-first) index to a position in the buffer"""
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("history index out of range")
+        return (self._start + index) % self.capacity
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._items[(self._start + i) % self.capacity]
+                    for i in range(*index.indices(self._size))]
+        return self._items[self._slot(index)]
+
+    def __iter__(self):
+        """Iterate from oldest to newest without copying"""
+        for i in range(self._size):
+            yield self._items[(self._start + i) % self.capacity]
+
+    def __reversed__(self):
+        """Iterate from newest to oldest without copying"""
+        for i in range(self._size - 1, -1, -1):
+            yield self._items[(self._start + i) % self.capacity]
+
+    def append(self, entry):
+        """
+        Add an entry, evicting the oldest one when the buffer is full
+
+        Returns:
+            The evicted entry, or None if nothing was evicted
+        """
+        entry["seq"] = self._next_seq
+        self._next_seq += 1
+        self.version += 1
+        evicted = None
+        if self._size < self.capacity:
+            self._items[(self._start + self._size) % self.capacity] = entry
+            self._size += 1
+        else:
+            evicted = self._items[self._start]
+            self._items[self._start] = entry
+            self._start = (self._start + 1) % self.capacity
+        return evicted
+
+    @property
+    def last_seq(self):
+        """Sequence number of the newest entry (-1 if none was ever added)"""
+        return self._next_seq - 1
+
+    def since(self, seq, limit=None):
+        """
+        Entries newer than ``seq``, oldest first
+
+        Args:
+            seq (int): Sequence number already seen by the caller
+            limit (int): Only return the newest ``limit`` of them
+        """
+        count = min(self._size, max(0, self.last_seq - seq))
+        if limit is not None:
+            count = min(count, limit)
+        return self[self._size - count:]
+
+    def older_than(self, seq=None):
+        """Iterate newest to oldest over entries with a sequence number below ``seq``"""
+        newest = self._size - 1
+        if seq is not None:
+            first_seq = self._next_seq - self._size
+            newest = min(newest, seq - first_seq - 1)
+        for i in range(newest, -1, -1):
+            yield self._items[(self._start + i) % self.capacity]
+
+    def write_lock(self):
+        """Writers in one process are already serialized by the caller"""
+        return nullcontext()
+
+    def read_lock(self):
+        """Readers in one process are already serialized by the caller"""
+        return nullcontext()
+
+    def touch(self):
+        """Bump the version for a change outside the entries (e.g. new settings)"""
+        self.version += 1
+
+    def clear(self):
+        """Remove every entry"""
+        self._items = [None] * self.capacity
+        self._start = 0
+        self._size = 0
+        self.version += 1
+
+    def resize(self, capacity):
+        """
+        Change the capacity, keeping the newest entries
+
+        Returns:
+            list: Entries dropped because they no longer fit (oldest first)
+        """
+        capacity = max(1, int(capacity))
+        if capacity == self.capacity:
+            return []
+        entries = list(self)
+        dropped = entries[:max(0, len(entries) - capacity)]
+        kept = entries[len(dropped):]
+        self.capacity = capacity
+        self._items = kept + [None] * (capacity - len(kept))
+        self._start = 0
+        self._size = len(kept)
+        self.version += 1
+        return dropped
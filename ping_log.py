@@ -0,0 +1,385 @@
+import os
+import mmap
+import fcntl
+import atexit
+import struct
+import threading
+from bisect import bisect_right
+from contextlib import contextmanager
+
+from shared_history import (RECORD, TIMING_KEYS, RESPONSE_BYTES, encode_entry,
+                            decode_entry)
+from latency_sketch import LatencySketch
+
+MAGIC = b"KAPLOG01"
+HEADER_SIZE = 16
+
+# Frame: total length of what follows, target id length, length of the
+# response text kept; then the target id and the record
+_FRAME = struct.Struct("<IHH")
+# Leading fields of a record: seq, unix time, success, flags, status, timings
+_PREFIX = struct.Struct("<QdBBH%dd" % len(TIMING_KEYS))
+_TOTAL_MS = 5 + TIMING_KEYS.index("total_ms")
+# The fixed-size response field of a record (after the timestamp and its length)
+_RESPONSE_AT = _PREFIX.size + 19 + 2
+_RESPONSE_END = _RESPONSE_AT + RESPONSE_BYTES
+
+# Index entries: unix time and file offset of a frame
+_INDEX_ENTRY = struct.Struct("<dQ")
+# Bytes of log between two index entries
+INDEX_SPACING = 64 * 1024
+# Size at which the log is rotated, and number of rotated logs kept
+MAX_BYTES = 64 * 1024 * 1024
+BACKUP_COUNT = 3
+
+class PingLog:
+    """
+    Append-only binary log of every ping result, for analysis and replay.
+
+    Each result is one length-prefixed frame holding the target id and the
+    binary record of ``shared_history.encode_entry`` with the zero padding
+    of its text fields cut out (about 100 bytes plus the response text). A sparse index file
+    next to the log (``<path>.idx``) maps the time of every ~64 KB of log to
+    its offset, so readers jump straight to the start of a time range.
+
+    Readers mmap the log and only decode the records they return; a month
+    of pings can be replayed or aggregated in seconds. Appends from several
+    processes are serialized with an exclusive ``flock`` on the log.
+
+    Once the log would grow past ``max_bytes`` it is renamed to
+    ``<path>.1`` (older ones shift to ``.2`` and so on, up to
+    ``backup_count``) and a new log is started, so disk use and replay
+    time stay bounded. Readers go through the rotated logs too.
+    """
+
+    def __init__(self, path, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+        """
+        Open (creating if needed) a log, repairing a frame torn by a crash
+
+        Args:
+            path (str): Log file; the index is kept in ``path + ".idx"``
+            max_bytes (int): Size at which the log is rotated (0 = never)
+            backup_count (int): Rotated logs kept (0 = drop the old log)
+        """
+        self.path = path
+        self.index_path = path + ".idx"
+        self.max_bytes = max_bytes
+        self.backup_count = max(0, int(backup_count))
+        self._lock = threading.Lock()
+        self._fd = self._index_fd = None
+        self._open_files()
+        with self._locked():
+            if os.pread(self._fd, len(MAGIC), 0) != MAGIC:
+                raise ValueError(f"{path} is not a ping log")
+            self._repair()
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                os.close(self._index_fd)
+                self._fd = self._index_fd = None
+
+    def _open_files(self):
+        """(Re)open the log and its index at their paths, closing the old ones"""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        index_fd = os.open(self.index_path, os.O_RDWR | os.O_CREAT, 0o644)
+        if self._fd is not None:
+            os.close(self._fd)
+            os.close(self._index_fd)
+        self._fd, self._index_fd = fd, index_fd
+
+    def _is_current(self):
+        """Whether the open log is still the one at ``path`` (not rotated away)"""
+        try:
+            return os.stat(self.path).st_ino == os.fstat(self._fd).st_ino
+        except FileNotFoundError:
+            return False
+
+    @contextmanager
+    def _locked(self):
+        """Thread lock plus exclusive flock on the current log"""
+        with self._lock:
+            while True:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+                if self._is_current():
+                    break
+                # Rotated by another process while we waited; lock the new log
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                self._open_files()
+            try:
+                self._initialize()
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _rotate(self):
+        """Move the log to ``path.1`` and start a new one (caller holds the lock)"""
+        for n in range(self.backup_count, 0, -1):
+            source = f"{self.path}.{n - 1}" if n > 1 else self.path
+            # The index goes first, so a process that re-opens the log as soon
+            # as it moves never finds the old index at the new path
+            for suffix in (".idx", ""):
+                if os.path.exists(source + suffix):
+                    os.replace(source + suffix, f"{self.path}.{n}{suffix}")
+        if not self.backup_count:
+            for name in (self.index_path, self.path):
+                try:
+                    os.unlink(name)
+                except FileNotFoundError:
+                    pass
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        index_fd = os.open(self.index_path, os.O_RDWR | os.O_CREAT, 0o644)
+        # Take the new log before letting go of the old one, so processes
+        # waiting on the old log queue up behind this append
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        os.close(self._fd)
+        os.close(self._index_fd)
+        self._fd, self._index_fd = fd, index_fd
+        self._initialize()
+
+    def _initialize(self):
+        """Write the header of a new, empty log (caller holds the lock)"""
+        if os.fstat(self._fd).st_size < HEADER_SIZE:
+            os.ftruncate(self._fd, 0)
+            os.write(self._fd, MAGIC.ljust(HEADER_SIZE, b"\0"))
+            os.ftruncate(self._index_fd, 0)
+
+    def _files(self):
+        """Paths of the rotated logs and the current one, oldest first"""
+        files = [f"{self.path}.{n}" for n in range(self.backup_count, 0, -1)]
+        return [name for name in files if os.path.exists(name)] + [self.path]
+
+    def _last_indexed(self):
+        size = os.fstat(self._index_fd).st_size
+        size -= size % _INDEX_ENTRY.size
+        if not size:
+            return None
+        return _INDEX_ENTRY.unpack(os.pread(self._index_fd, _INDEX_ENTRY.size,
+                                            size - _INDEX_ENTRY.size))
+
+    def _repair(self):
+        """Drop a partial last frame and index frames past the last index entry"""
+        size = os.fstat(self._fd).st_size
+        last = self._last_indexed()
+        offset = last[1] if last is not None and last[1] < size else HEADER_SIZE
+        if last is not None and last[1] >= size:
+            os.ftruncate(self._index_fd, 0)
+            last = None
+        data = os.pread(self._fd, size - offset, offset)
+        position = 0
+        indexed = last[1] if last is not None else None
+        while position + _FRAME.size <= len(data):
+            length, target_length, _ = _FRAME.unpack_from(data, position)
+            end = position + _FRAME.size + length
+            if end > len(data) or target_length > length:
+                break
+            frame_offset = offset + position
+            if indexed is None or frame_offset - indexed >= INDEX_SPACING:
+                when = _PREFIX.unpack_from(data, position + _FRAME.size + target_length)[1]
+                self._append_index(when, frame_offset)
+                indexed = frame_offset
+            position = end
+        if offset + position < size:
+            os.ftruncate(self._fd, offset + position)
+
+    def _append_index(self, when, offset):
+        size = os.fstat(self._index_fd).st_size
+        size -= size % _INDEX_ENTRY.size
+        os.pwrite(self._index_fd, _INDEX_ENTRY.pack(when, offset), size)
+
+    def append(self, target, entry, when):
+        """
+        Add a ping result to the end of the log, rotating it first if full
+
+        Args:
+            target (str): Target id the result belongs to
+            entry (dict): Result dict produced by ``KeepAliveService.ping_server``
+            when (float): Unix time of the ping
+        """
+        target = target.encode("utf-8")[:0xFFFF]
+        record = encode_entry(entry.get("seq", 0), entry, when)
+        response = record[_RESPONSE_AT:_RESPONSE_END].rstrip(b"\0")
+        record = record[:_RESPONSE_AT] + response + record[_RESPONSE_END:].rstrip(b"\0")
+        frame = (_FRAME.pack(len(target) + len(record), len(target), len(response))
+                 + target + record)
+        with self._locked():
+            offset = os.fstat(self._fd).st_size
+            if self.max_bytes and offset > HEADER_SIZE and offset + len(frame) > self.max_bytes:
+                self._rotate()
+                offset = HEADER_SIZE
+            os.pwrite(self._fd, frame, offset)
+            last = self._last_indexed()
+            if last is None or offset - last[1] >= INDEX_SPACING:
+                self._append_index(when, offset)
+
+    def _frames(self, since=None, until=None, target=None):
+        """
+        Iterate over (target bytes, record buffer) of frames in a time range,
+        through the rotated logs and then the current one
+
+        The record buffer is zero-padded to ``RECORD.size`` and reused, so it
+        is only valid until the next iteration.
+        """
+        for name in self._files():
+            start = HEADER_SIZE
+            if since is not None:
+                index = _read_index(name + ".idx")
+                i = bisect_right([when for when, _ in index], since) - 1
+                # Step back one more entry: pings of concurrent threads may be
+                # appended slightly out of time order
+                if i >= 1:
+                    start = index[i - 1][1]
+            yield from _scan(name, start, None, since, until, target)
+
+    def replay(self, since=None, until=None, target=None):
+        """
+        Iterate over logged results, oldest first
+
+        Args:
+            since (float): Only pings at or after this Unix time
+            until (float): Only pings before this Unix time
+            target (str): Only pings of this target
+
+        Yields:
+            tuple: (target, unix time, result dict)
+        """
+        for name, record in self._frames(since, until, target):
+            _, when, entry = decode_entry(record)
+            yield name.decode("utf-8"), when, entry
+
+    def recent(self, target, limit=100):
+        """
+        Most recent results of a target
+
+        Walks the sparse index backwards from the end of the newest log, so
+        only the last few index segments are read however long the log is.
+
+        Returns:
+            list: (unix time, result dict) pairs, oldest first
+        """
+        if limit <= 0:
+            return []
+        found = []
+        for name in reversed(self._files()):
+            index = _read_index(name + ".idx")
+            starts = [offset for _, offset in index if offset > HEADER_SIZE]
+            end = None
+            for start in reversed([HEADER_SIZE] + starts):
+                segment = []
+                for _, record in _scan(name, start, end, target=target):
+                    _, when, entry = decode_entry(record)
+                    segment.append((when, entry))
+                found[:0] = segment
+                if len(found) >= limit:
+                    return found[-limit:]
+                end = start
+        return found
+
+    def aggregate(self, since=None, until=None):
+        """
+        Per-target counts and latency sketches over a time range
+
+        Only the fixed leading fields of each record are unpacked, so no
+        result dict is built.
+
+        Returns:
+            dict: target -> {"count", "success_count", "latency": LatencySketch}
+        """
+        totals = {}
+        for name, record in self._frames(since, until):
+            fields = _PREFIX.unpack_from(record)
+            total = totals.get(name)
+            if total is None:
+                total = totals[name] = {"count": 0, "success_count": 0,
+                                        "latency": LatencySketch()}
+            total["count"] += 1
+            total["success_count"] += fields[2]
+            if fields[4]:
+                # Only pings that got a response are timed
+                total["latency"].add(fields[_TOTAL_MS])
+        return {name.decode("utf-8"): total for name, total in totals.items()}
+
+def _read_index(path):
+    """Index entries of a log as a list of (unix time, offset)"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    usable = len(data) - len(data) % _INDEX_ENTRY.size
+    return list(_INDEX_ENTRY.iter_unpack(data[:usable]))
+
+def _scan(path, start, end=None, since=None, until=None, target=None):
+    """
+    Iterate over (target bytes, record buffer) of the frames of one log file
+    that begin between offsets ``start`` and ``end`` (the end of the file if None)
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return  # Rotated away meanwhile
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        end = size if end is None else min(end, size)
+        if start >= end:
+            return
+        wanted = target.encode("utf-8") if target is not None else None
+        padded = bytearray(RECORD.size)
+        zeros = memoryview(bytes(RECORD.size))
+        with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as data:
+            view = memoryview(data)
+            try:
+                position = start
+                while position < end and position + _FRAME.size <= size:
+                    length, target_length, response_length = _FRAME.unpack_from(data, position)
+                    body = position + _FRAME.size
+                    position = body + length
+                    if position > size:
+                        break
+                    if wanted is not None and (target_length != len(wanted)
+                                               or data[body:body + target_length] != wanted):
+                        continue
+                    record = body + target_length
+                    when = _PREFIX.unpack_from(data, record)[1]
+                    if since is not None and when < since:
+                        continue
+                    if until is not None and when >= until:
+                        # Slightly out-of-order frames may still follow
+                        if when >= until + 60:
+                            break
+                        continue
+                    # Put the cut zero padding back
+                    response_end = record + _RESPONSE_AT + response_length
+                    tail_length = position - response_end
+                    padded[:_RESPONSE_AT + response_length] = view[record:response_end]
+                    padded[_RESPONSE_AT + response_length:_RESPONSE_END] = \
+                        zeros[_RESPONSE_AT + response_length:_RESPONSE_END]
+                    padded[_RESPONSE_END:_RESPONSE_END + tail_length] = view[response_end:position]
+                    padded[_RESPONSE_END + tail_length:] = zeros[_RESPONSE_END + tail_length:]
+                    yield data[body:body + target_length], padded
+            finally:
+                view.release()
+
+# Shared logs used by every KeepAliveService in the process, one per path
+_logs = {}
+_logs_lock = threading.Lock()
+
+def get_ping_log(path, max_bytes=None, backup_count=None):
+    """
+    Return the process-wide ping log for a file, opening it on first use
+
+    Args:
+        path (str): Log file
+        max_bytes (int): Rotation size used when the log is opened
+        backup_count (int): Rotated logs kept, used when the log is opened
+    """
+    path = os.path.abspath(path)
+    with _logs_lock:
+        log = _logs.get(path)
+        if log is None:
+            log = _logs[path] = PingLog(
+                path, max_bytes if max_bytes is not None else MAX_BYTES,
+                backup_count if backup_count is not None else BACKUP_COUNT)
+            atexit.register(log.close)
+        return log
@@ -0,0 +1,150 @@
+import time
+from array import array
+
+# Layout of the flat counter array
+_TOTAL, _SUCCESS = 0, 1
+_HIST_COUNT, _HIST_SUCCESS = 2, 3
+_LAST_MINUTE = 4
+_HOUR_COUNT, _HOUR_SUCCESS = 5, 6
+_DAY_COUNT, _DAY_SUCCESS = 7, 8
+_BUCKETS = 9
+
+HOUR_MINUTES = 60
+DAY_MINUTES = 24 * 60
+STATE_SIZE = _BUCKETS + 2 * DAY_MINUTES
+STATE_BYTES = 8 * STATE_SIZE
+
+def _summary(count, success):
+    return {
+        "count": count,
+        "success_count": success,
+        "failure_count": count - success,
+        "success_rate": (success / count) * 100 if count else 0,
+    }
+
+class PingStats:
+    """
+    Success/failure counters maintained incrementally as pings are recorded.
+
+    Keeps all-time totals, totals over the entries still held in the history
+    buffer (adjusted on eviction) and sliding last-hour/last-24h windows built
+    from per-minute buckets, so every read is constant time.
+
+    All state lives in one flat int64 array, which can be placed in a shared
+    memory buffer so several processes see the same counters.
+    """
+
+    def __init__(self, buffer=None):
+        """
+        Args:
+            buffer: Writable buffer of ``STATE_BYTES`` bytes to keep the
+                counters in (defaults to private memory)
+        """
+        self._state = array('q', bytes(STATE_BYTES))
+        if buffer is not None:
+            self.rebind(buffer)
+
+    def rebind(self, buffer):
+        """Switch to counters stored in ``buffer`` (e.g. a remapped file)"""
+        self._state = memoryview(buffer).cast('q')
+
+    def to_bytes(self):
+        """Raw counter state, e.g. for copying into a new buffer"""
+        return self._state.tobytes()
+
+    def load(self, data):
+        """Overwrite the counters with raw state from ``to_bytes``"""
+        memoryview(self._state).cast('B')[:] = data
+
+    def _bucket(self, minute):
+        return _BUCKETS + 2 * (minute % DAY_MINUTES)
+
+    def _advance(self, minute):
+        """Move the window edge forward to ``minute``, expiring old buckets"""
+        state = self._state
+        last = state[_LAST_MINUTE]
+        if minute <= last:
+            return
+        if minute - last >= DAY_MINUTES:
+            for i in range(_HOUR_COUNT, STATE_SIZE):
+                state[i] = 0
+        else:
+            for m in range(last + 1, minute + 1):
+                if m - HOUR_MINUTES <= last:
+                    leaving_hour = self._bucket(m - HOUR_MINUTES)
+                    state[_HOUR_COUNT] -= state[leaving_hour]
+                    state[_HOUR_SUCCESS] -= state[leaving_hour + 1]
+                # This slot still holds the minute that just left the 24h window
+                slot = self._bucket(m)
+                state[_DAY_COUNT] -= state[slot]
+                state[_DAY_SUCCESS] -= state[slot + 1]
+                state[slot] = state[slot + 1] = 0
+        state[_LAST_MINUTE] = minute
+
+    def record(self, success, when=None):
+        """
+        Count a new ping result
+
+        Args:
+            success (bool): Whether the ping succeeded
+            when (float): Unix time of the ping (defaults to now)
+        """
+        minute = int((when if when is not None else time.time()) // 60)
+        self._advance(minute)
+        hit = 1 if success else 0
+        state = self._state
+        state[_TOTAL] += 1
+        state[_SUCCESS] += hit
+        state[_HIST_COUNT] += 1
+        state[_HIST_SUCCESS] += hit
+        if minute > state[_LAST_MINUTE] - DAY_MINUTES:
+            slot = self._bucket(minute)
+            state[slot] += 1
+            state[slot + 1] += hit
+            state[_DAY_COUNT] += 1
+            state[_DAY_SUCCESS] += hit
+            if minute > state[_LAST_MINUTE] - HOUR_MINUTES:
+                state[_HOUR_COUNT] += 1
+                state[_HOUR_SUCCESS] += hit
+
+    def evict(self, success):
+        """Remove an entry that dropped out of the history buffer"""
+        self._state[_HIST_COUNT] -= 1
+        self._state[_HIST_SUCCESS] -= 1 if success else 0
+
+    def reset_history(self):
+        """Forget the history totals (after the history buffer was cleared)"""
+        self._state[_HIST_COUNT] = 0
+        self._state[_HIST_SUCCESS] = 0
+
+    def _window(self, minutes, count_index, now_minute):
+        """Window totals as of ``now_minute`` without mutating the state"""
+        state = self._state
+        count, success = state[count_index], state[count_index + 1]
+        last = state[_LAST_MINUTE]
+        idle = now_minute - last
+        if idle <= 0:
+            return count, success
+        if idle >= minutes:
+            return 0, 0
+        for m in range(last - minutes + 1, last - minutes + 1 + idle):
+            slot = self._bucket(m)
+            count -= state[slot]
+            success -= state[slot + 1]
+        return count, success
+
+    def snapshot(self, now=None):
+        """
+        Return the current statistics
+
+        Args:
+            now (float): Unix time the windows are evaluated at (defaults to now)
+        """
+        now_minute = int((now if now is not None else time.time()) // 60)
+        state = self._state
+        return {
+            "history": _summary(state[_HIST_COUNT], state[_HIST_SUCCESS]),
+            "last_hour": _summary(*self._window(HOUR_MINUTES, _HOUR_COUNT, now_minute)),
+            "last_24h": _summary(*self._window(DAY_MINUTES, _DAY_COUNT, now_minute)),
+            "all_time": _summary(state[_TOTAL], state[_SUCCESS]),
+        }
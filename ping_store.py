@@ -0,0 +1,465 @@
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from sqlalchemy import (create_engine, event, inspect, MetaData, Table, Column, Index,
+                        Integer, BigInteger, String, Float, Boolean, DateTime, Text,
+                        LargeBinary, select, and_, or_)
+from sqlalchemy.exc import SQLAlchemyError
+from latency_sketch import LatencySketch
+
+TABLE_PREFIX = "ping_results_"
+
+# Aggregate tables filled by the rollup job, by resolution
+ROLLUP_TABLES = {"minute": "ping_rollup_minute", "hour": "ping_rollup_hour"}
+
+def partition_suffix(when):
+    """Monthly partition (``YYYYMM``) holding a ping made at Unix time ``when``"""
+    return datetime.fromtimestamp(when, timezone.utc).strftime("%Y%m")
+
+def utc_datetime(when):
+    """Naive UTC datetime (as stored in the tables) for a Unix time"""
+    return datetime.fromtimestamp(when, timezone.utc).replace(tzinfo=None)
+
+def unix_time(ts):
+    """Unix time of a naive UTC datetime read from the tables"""
+    return ts.replace(tzinfo=timezone.utc).timestamp()
+
+def bucket_start(ts, resolution):
+    """Start of the ``minute`` or ``hour`` bucket holding the datetime ``ts``"""
+    if resolution == "minute":
+        return ts.replace(second=0, microsecond=0)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+def normalize_url(url):
+    """Accept the ``postgres://`` scheme many hosting providers hand out"""
+    if url and url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+class PingStore:
+    """
+    Durable store of ping results (SQLite locally, Postgres in production).
+
+    Results are queued in memory and written by a background thread in
+    multi-row INSERT statements, so the ping path never waits on the
+    database. Rows go to one table per calendar month (``ping_results_YYYYMM``),
+    each indexed on (target, ts): inserts only touch a small recent index and
+    old months can be dropped as a whole.
+    """
+
+    # Rows per INSERT statement (keeps SQLite under its bound-parameter limit)
+    ROWS_PER_STATEMENT = 100
+
+    def __init__(self, url, batch_size=500, flush_interval=1.0, max_queue=100000):
+        """
+        Args:
+            url (str): SQLAlchemy database URL
+            batch_size (int): Maximum number of rows written per transaction
+            flush_interval (float): Seconds the writer waits to fill a batch
+            max_queue (int): Results buffered before new ones are dropped
+        """
+        self.url = normalize_url(url)
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.logger = logging.getLogger("keep_alive.store")
+        self.dropped = 0
+
+        connect_args = {}
+        if self.url.startswith("sqlite"):
+            connect_args["timeout"] = 30
+        self.engine = create_engine(self.url, pool_pre_ping=True, connect_args=connect_args)
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine, "connect", self._sqlite_pragmas)
+
+        self.metadata = MetaData()
+        self._tables = {}
+        self._tables_lock = threading.Lock()
+        self._queue = queue.Queue(max_queue)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._closed = False
+
+    @staticmethod
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers (dashboards) run while the writer commits
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    # -- partitions ------------------------------------------------------
+
+    def _define(self, suffix):
+        name = TABLE_PREFIX + suffix
+        return Table(
+            name, self.metadata,
+            Column("id", BigInteger().with_variant(Integer, "sqlite"),
+                   primary_key=True, autoincrement=True),
+            Column("target", String(512), nullable=False),
+            Column("ts", DateTime, nullable=False),
+            Column("success", Boolean, nullable=False),
+            Column("status_code", Integer),
+            Column("latency_ms", Float),
+            Column("timings", Text),
+            Column("response", Text),
+            Column("error", Text),
+            Index(f"ix_{name}_target_ts", "target", "ts"),
+        )
+
+    def table(self, suffix, create=True):
+        """
+        Return the partition table for ``suffix`` (``YYYYMM``)
+
+        Args:
+            create (bool): Create the table if it does not exist yet
+        """
+        with self._tables_lock:
+            table = self._tables.get(suffix)
+            if table is not None:
+                return table
+            table = self.metadata.tables.get(TABLE_PREFIX + suffix)
+            if table is None:
+                table = self._define(suffix)
+            if create:
+                try:
+                    table.create(self.engine, checkfirst=True)
+                except SQLAlchemyError:
+                    # Another process may have created it concurrently
+                    if not inspect(self.engine).has_table(table.name):
+                        raise
+            self._tables[suffix] = table
+            return table
+
+    def partitions(self):
+        """Suffixes of the existing partitions, oldest first"""
+        names = inspect(self.engine).get_table_names()
+        return sorted(name[len(TABLE_PREFIX):] for name in names
+                      if name.startswith(TABLE_PREFIX) and name[len(TABLE_PREFIX):].isdigit())
+
+    def drop_partition(self, suffix):
+        """Drop a whole monthly partition"""
+        table = self.table(suffix, create=False)
+        table.drop(self.engine, checkfirst=True)
+        with self._tables_lock:
+            self._tables.pop(suffix, None)
+            self.metadata.remove(table)
+
+    def rollup_table(self, resolution):
+        """Return (creating it if needed) the aggregate table for ``minute`` or ``hour``"""
+        name = ROLLUP_TABLES[resolution]
+        with self._tables_lock:
+            table = self._tables.get(name)
+            if table is not None:
+                return table
+            table = Table(
+                name, self.metadata,
+                Column("id", BigInteger().with_variant(Integer, "sqlite"),
+                       primary_key=True, autoincrement=True),
+                Column("target", String(512), nullable=False),
+                Column("bucket", DateTime, nullable=False),
+                Column("count", Integer, nullable=False),
+                Column("success_count", Integer, nullable=False),
+                Column("latency_count", Integer, nullable=False),
+                Column("latency_min", Float),
+                Column("latency_max", Float),
+                Column("latency_sum", Float),
+                Column("sketch", LargeBinary),
+                Index(f"ix_{name}_target_bucket", "target", "bucket", unique=True),
+            )
+            try:
+                table.create(self.engine, checkfirst=True)
+            except SQLAlchemyError:
+                if not inspect(self.engine).has_table(name):
+                    raise
+            self._tables[name] = table
+            return table
+
+    # -- writing ---------------------------------------------------------
+
+    def add(self, target, result, when):
+        """
+        Queue a ping result for writing
+
+        Args:
+            target (str): Identifier of the pinged target
+            result (dict): Result dict produced by ``KeepAliveService.ping_server``
+            when (float): Unix time of the ping
+        """
+        if self._closed:
+            return False
+        timings = result.get("timings")
+        row = {
+            "target": target,
+            "ts": utc_datetime(when),
+            "success": bool(result.get("success")),
+            "status_code": result.get("status_code"),
+            "latency_ms": timings.get("total_ms") if timings else None,
+            "timings": json.dumps(timings) if timings else None,
+            "response": result.get("response"),
+            "error": result.get("error"),
+        }
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((partition_suffix(when), row))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                self.logger.warning(f"Ping store queue full; {self.dropped} results dropped")
+            return False
+        return True
+
+    def _ensure_writer(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run, name="keep_alive_store")
+                self._writer.daemon = True
+                self._writer.start()
+
+    def _run(self):
+        """Writer thread: gather queued rows into batches and insert them"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch, waiters = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._write(batch)
+                    return
+            if batch:
+                self._write(batch)
+            for waiter in waiters:
+                waiter.set()
+
+    def _write(self, batch):
+        by_partition = {}
+        for suffix, row in batch:
+            by_partition.setdefault(suffix, []).append(row)
+        try:
+            # Create new partitions before opening the write transaction
+            tables = {suffix: self.table(suffix) for suffix in by_partition}
+            with self.engine.begin() as conn:
+                for suffix, rows in by_partition.items():
+                    table = tables[suffix]
+                    for i in range(0, len(rows), self.ROWS_PER_STATEMENT):
+                        conn.execute(table.insert().values(rows[i:i + self.ROWS_PER_STATEMENT]))
+        except SQLAlchemyError as e:
+            self.dropped += len(batch)
+            self.logger.error(f"Error writing {len(batch)} ping results: {e}")
+
+    def flush(self, timeout=10):
+        """Block until every result queued so far has been written"""
+        if self._writer is None or not self._writer.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=10):
+        """Write out pending results and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout)
+        self.engine.dispose()
+
+    # -- reading ---------------------------------------------------------
+
+    def recent(self, target, limit=100):
+        """
+        Most recent results of a target
+
+        Returns:
+            list: (unix time, result dict) pairs, oldest first
+        """
+        found = []
+        if limit <= 0:
+            return found
+        with self.engine.connect() as conn:
+            for suffix in reversed(self.partitions()):
+                table = self.table(suffix, create=False)
+                rows = conn.execute(
+                    select(table).where(table.c.target == target)
+                    .order_by(table.c.ts.desc(), table.c.id.desc())
+                    .limit(limit - len(found))).all()
+                found.extend(rows)
+                if len(found) >= limit:
+                    break
+        return [self._to_result(row) for row in reversed(found)]
+
+    def query(self, target, cursor=None, limit=50, success=None, status_code=None,
+              since=None, until=None):
+        """
+        Page through the results of a target, newest first
+
+        Args:
+            cursor (str): ``next_cursor`` returned with the previous page
+            limit (int): Maximum number of results in the page
+            success (bool): Only successful (True) or failed (False) pings
+            status_code (int): Only pings answered with this status code
+            since (float): Only pings at or after this Unix time
+            until (float): Only pings before this Unix time
+
+        Returns:
+            tuple: (list of result dicts, cursor of the next page or None)
+        """
+        before = None
+        if cursor:
+            ts_text, id_text = cursor.rsplit(":", 1)
+            before = (datetime.fromisoformat(ts_text), int(id_text))
+        found = []
+        with self.engine.connect() as conn:
+            for suffix in reversed(self.partitions()):
+                if since is not None and suffix < partition_suffix(since):
+                    break
+                if until is not None and suffix > partition_suffix(until):
+                    continue
+                if before is not None and suffix > before[0].strftime("%Y%m"):
+                    continue
+                table = self.table(suffix, create=False)
+                query = select(table).where(table.c.target == target)
+                if success is not None:
+                    query = query.where(table.c.success == success)
+                if status_code is not None:
+                    query = query.where(table.c.status_code == status_code)
+                if since is not None:
+                    query = query.where(table.c.ts >= utc_datetime(since))
+                if until is not None:
+                    query = query.where(table.c.ts < utc_datetime(until))
+                if before is not None:
+                    query = query.where(or_(table.c.ts < before[0],
+                                            and_(table.c.ts == before[0], table.c.id < before[1])))
+                rows = conn.execute(query.order_by(table.c.ts.desc(), table.c.id.desc())
+                                    .limit(limit + 1 - len(found))).all()
+                found.extend(rows)
+                if len(found) > limit:
+                    break
+        next_cursor = None
+        if len(found) > limit:
+            found = found[:limit]
+            next_cursor = f"{found[-1].ts.isoformat()}:{found[-1].id}"
+        page = []
+        for row in found:
+            _, entry = self._to_result(row)
+            entry["target"] = row.target
+            page.append(entry)
+        return page, next_cursor
+
+    def rollups(self, target, since, until=None, resolution="hour"):
+        """
+        Aggregated results of a target between two Unix times
+
+        Every tier is read: hourly rows, minute rows merged into the
+        requested buckets and the raw results not rolled up yet, which are
+        aggregated on the fly. At ``minute`` resolution, periods already
+        compacted to hours come back as one bucket per hour.
+
+        Args:
+            resolution (str): ``minute`` or ``hour``
+
+        Returns:
+            list: Dicts with the bucket start, counts and a latency summary,
+            oldest first
+        """
+        start = utc_datetime(since)
+        end = utc_datetime(until) if until is not None else None
+        # bucket start -> [count, success count, latency sketch]
+        buckets = {}
+
+        def bucket(ts):
+            key = bucket_start(ts, resolution)
+            entry = buckets.get(key)
+            if entry is None:
+                entry = buckets[key] = [0, 0, LatencySketch()]
+            return entry
+
+        with self.engine.connect() as conn:
+            for tier in ("hour", "minute"):
+                table = self.rollup_table(tier)
+                query = select(table).where(table.c.target == target, table.c.bucket >= start)
+                if end is not None:
+                    query = query.where(table.c.bucket < end)
+                for row in conn.execute(query):
+                    entry = bucket(row.bucket)
+                    entry[0] += row.count
+                    entry[1] += row.success_count
+                    if row.sketch:
+                        entry[2].merge(LatencySketch.from_bytes(row.sketch))
+            for suffix in self.partitions():
+                if suffix < partition_suffix(since):
+                    continue
+                if until is not None and suffix > partition_suffix(until):
+                    break
+                table = self.table(suffix, create=False)
+                query = (select(table.c.ts, table.c.success, table.c.latency_ms)
+                         .where(table.c.target == target, table.c.ts >= start))
+                if end is not None:
+                    query = query.where(table.c.ts < end)
+                for row in conn.execute(query):
+                    entry = bucket(row.ts)
+                    entry[0] += 1
+                    entry[1] += 1 if row.success else 0
+                    entry[2].add(row.latency_ms)
+
+        series = []
+        for key in sorted(buckets):
+            count, success_count, sketch = buckets[key]
+            series.append({
+                "bucket": unix_time(key),
+                "count": count,
+                "success_count": success_count,
+                "success_rate": round(success_count / count * 100, 2) if count else 0,
+                "latency": sketch.summary(),
+            })
+        return series
+
+    @staticmethod
+    def _to_result(row):
+        when = unix_time(row.ts)
+        return when, {
+            "timestamp": datetime.fromtimestamp(when).strftime("%Y-%m-%d %H:%M:%S"),
+            "success": row.success,
+            "status_code": row.status_code,
+            "response": row.response,
+            "error": row.error,
+            "timings": json.loads(row.timings) if row.timings else None,
+        }
+
+# Shared stores used by every KeepAliveService in the process, one per URL
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(url, batch_size=None, flush_interval=None):
+    """
+    Return the process-wide store for a database URL, creating it on first use
+
+    The store is flushed and closed when the interpreter exits.
+    """
+    url = normalize_url(url)
+    with _stores_lock:
+        store = _stores.get(url)
+        if store is None:
+            store = PingStore(url, batch_size or 500,
+                              flush_interval if flush_interval is not None else 1.0)
+            _stores[url] = store
+            atexit.register(store.close)
+        return store
@@ -0,0 +1,106 @@
+import re
+import json
+import time
+from urllib.parse import urlencode
+
+# Payload values equal to this marker are filled in at send time
+DYNAMIC_MARKER = "auto"
+
+# Generators for the fields that may use the marker; values are already encoded
+DYNAMIC_FIELDS = {
+    "timestamp": lambda: str(int(time.time())),
+}
+
+_PLACEHOLDER = "__keepalive_dynamic_{}__"
+
+class PreparedPing:
+    """
+    Ping request (method, headers and encoded body) computed once per
+    configuration version.
+
+    Payloads without dynamic fields are encoded to bytes up front and reused
+    as-is. Payloads with ``"auto"`` fields (e.g. ``"timestamp": "auto"``) are
+    compiled into static byte segments; only the dynamic values are rendered
+    and spliced in for each ping.
+    """
+
+    def __init__(self, method, headers, data, version=0):
+        """
+        Compile a request
+
+        Args:
+            method (str): HTTP method
+            headers (dict): Request headers
+            data: Payload (dict, string or None)
+            version (int): Configuration version this request was built from
+        """
+        self.method = (method or 'POST').upper()
+        self.headers = dict(headers or {})
+        self.version = version
+        self._segments = None
+        self._fields = ()
+        self._body = None
+        if self.method != 'GET' and data is not None:
+            self._compile(data)
+
+    def _compile(self, data):
+        fields = []
+
+        def placeholder(name):
+            fields.append(name)
+            return _PLACEHOLDER.format(len(fields) - 1)
+
+        content_type = self.headers.get('Content-Type', 'application/json')
+        if isinstance(data, str):
+            # Form strings such as "status=alive&timestamp=auto"
+            pattern = r'(?<![^&])({})={}(?=&|$)'.format(
+                '|'.join(re.escape(name) for name in DYNAMIC_FIELDS), DYNAMIC_MARKER)
+            text = re.sub(pattern, lambda m: f"{m.group(1)}={placeholder(m.group(1))}", data)
+            tokens = [_PLACEHOLDER.format(i) for i in range(len(fields))]
+        elif isinstance(data, dict):
+            templated = self._mark_dynamic(data, placeholder)
+            if 'application/x-www-form-urlencoded' in content_type:
+                text = urlencode(templated, doseq=True)
+                tokens = [_PLACEHOLDER.format(i) for i in range(len(fields))]
+            else:
+                text = json.dumps(templated)
+                tokens = [json.dumps(_PLACEHOLDER.format(i)) for i in range(len(fields))]
+        else:
+            text, tokens = str(data), []
+
+        if not fields:
+            self._body = text.encode('utf-8')
+            return
+
+        # Split the encoded payload around each placeholder token
+        segments = []
+        for token in tokens:
+            head, text = text.split(token, 1)
+            segments.append(head.encode('utf-8'))
+        segments.append(text.encode('utf-8'))
+        self._segments = segments
+        self._fields = tuple(DYNAMIC_FIELDS[name] for name in fields)
+
+    def _mark_dynamic(self, value, placeholder):
+        """Copy a JSON-like value, replacing dynamic markers with placeholders"""
+        if isinstance(value, dict):
+            return {
+                key: placeholder(key)
+                if key in DYNAMIC_FIELDS and item == DYNAMIC_MARKER
+                else self._mark_dynamic(item, placeholder)
+                for key, item in value.items()
+            }
+        if isinstance(value, list):
+            return [self._mark_dynamic(item, placeholder) for item in value]
+        return value
+
+    def body(self):
+        """Return the encoded request body for one ping (None when there is none)"""
+        if self._segments is None:
+            return self._body
+        segments = self._segments
+        parts = [segments[0]]
+        for i, render in enumerate(self._fields):
+            parts.append(render().encode('ascii'))
+            parts.append(segments[i + 1])
+        return b''.join(parts)
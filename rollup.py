@@ -0,0 +1,210 @@
+import time
+import logging
+import threading
+from datetime import timedelta
+from sqlalchemy import select, delete, func
+from sqlalchemy.exc import SQLAlchemyError
+from latency_sketch import LatencySketch
+from ping_store import partition_suffix, utc_datetime
+
+DAY = 86400
+
+# Aggregate rows per INSERT statement (10 columns each, under SQLite's parameter limit)
+_ROWS_PER_STATEMENT = 90
+
+class _Aggregate:
+    """Counts and latency sketch of one target over one bucket"""
+
+    def __init__(self):
+        self.count = 0
+        self.success_count = 0
+        self.sketch = LatencySketch()
+
+    def add_row(self, row):
+        """Fold a stored aggregate row into this one"""
+        self.count += row.count
+        self.success_count += row.success_count
+        if row.sketch:
+            self.sketch.merge(LatencySketch.from_bytes(row.sketch))
+
+    def to_row(self, target, bucket):
+        sketch = self.sketch
+        return {
+            "target": target,
+            "bucket": bucket,
+            "count": self.count,
+            "success_count": self.success_count,
+            "latency_count": sketch.count,
+            "latency_min": sketch.min if sketch else None,
+            "latency_max": sketch.max if sketch else None,
+            "latency_sum": sketch.sum,
+            "sketch": sketch.to_bytes(),
+        }
+
+def _minute(ts):
+    return ts.replace(second=0, microsecond=0)
+
+def _hour(ts):
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+def _day(ts):
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+class RollupJob:
+    """
+    Compacts old ping results into per-minute and per-hour aggregates.
+
+    Raw results older than ``raw_retention`` are folded into per-minute rows
+    (count, success count, latency min/max/sum and a mergeable percentile
+    sketch) and deleted; emptied monthly partitions are dropped. Minute rows
+    older than ``minute_retention`` are merged the same way into hourly rows,
+    which are kept, so a 90-day dashboard reads about 2,000 rows per target.
+
+    Work is done in small time slices, one transaction each, and late rows
+    are merged into existing aggregates, so the job can be interrupted and
+    re-run at any time.
+    """
+
+    def __init__(self, store, raw_retention=7 * DAY, minute_retention=30 * DAY,
+                 interval=3600):
+        """
+        Args:
+            store (PingStore): Store to compact
+            raw_retention (float): Seconds raw results are kept
+            minute_retention (float): Seconds minute aggregates are kept
+            interval (float): Seconds between runs of the background thread
+        """
+        self.store = store
+        self.raw_retention = raw_retention
+        self.minute_retention = max(minute_retention, raw_retention)
+        self.interval = interval
+        self.logger = logging.getLogger("keep_alive.rollup")
+        self.thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Run the job periodically in a background thread"""
+        if self.thread is not None and self.thread.is_alive():
+            return False
+        self._stopped.clear()
+        self.thread = threading.Thread(target=self._run, name="keep_alive_rollup")
+        self.thread.daemon = True
+        self.thread.start()
+        return True
+
+    def stop(self):
+        """Stop the background thread after the current slice"""
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except SQLAlchemyError as e:
+                self.logger.error(f"Error rolling up ping history: {e}")
+            self._stopped.wait(self.interval)
+
+    def run_once(self, now=None):
+        """
+        Compact everything past the retention ages
+
+        Args:
+            now (float): Unix time the ages are measured from (defaults to now)
+
+        Returns:
+            dict: Number of raw and minute rows compacted and partitions dropped
+        """
+        now = now if now is not None else time.time()
+        raw_cutoff = _minute(utc_datetime(now - self.raw_retention))
+        minute_cutoff = _hour(utc_datetime(now - self.minute_retention))
+        summary = {"raw_rows": 0, "minute_rows": 0, "dropped_partitions": []}
+
+        for suffix in self.store.partitions():
+            if suffix > partition_suffix(now - self.raw_retention):
+                break
+            table = self.store.table(suffix, create=False)
+            summary["raw_rows"] += self._compact(
+                table, table.c.ts, raw_cutoff, timedelta(hours=1), _minute,
+                self._raw_aggregates, self.store.rollup_table("minute"))
+            if suffix < partition_suffix(now - self.raw_retention):
+                with self.store.engine.connect() as conn:
+                    remaining = conn.execute(select(func.count()).select_from(table)).scalar()
+                if not remaining:
+                    self.store.drop_partition(suffix)
+                    summary["dropped_partitions"].append(suffix)
+
+        minutes = self.store.rollup_table("minute")
+        summary["minute_rows"] = self._compact(
+            minutes, minutes.c.bucket, minute_cutoff, timedelta(days=1), _hour,
+            self._rollup_aggregates, self.store.rollup_table("hour"))
+
+        if summary["raw_rows"] or summary["minute_rows"]:
+            self.logger.info(
+                f"Rolled up {summary['raw_rows']} results and {summary['minute_rows']} "
+                f"minute aggregates; dropped partitions: {summary['dropped_partitions']}")
+        return summary
+
+    def _compact(self, source, time_column, cutoff, slice_length, bucket_of,
+                 aggregate, destination):
+        """Move rows of ``source`` older than ``cutoff`` into ``destination`` slice by slice"""
+        compacted = 0
+        engine = self.store.engine
+        while not self._stopped.is_set():
+            with engine.connect() as conn:
+                oldest = conn.execute(
+                    select(func.min(time_column)).where(time_column < cutoff)).scalar()
+            if oldest is None:
+                break
+            start = _day(oldest) if slice_length >= timedelta(days=1) else _hour(oldest)
+            end = min(start + slice_length, cutoff)
+            in_slice = (time_column >= start) & (time_column < end)
+            with engine.begin() as conn:
+                rows = conn.execute(select(source).where(in_slice)).all()
+                aggregates = aggregate(rows, bucket_of)
+                self._merge(conn, destination, aggregates, start, end)
+                conn.execute(delete(source).where(in_slice))
+            compacted += len(rows)
+        return compacted
+
+    @staticmethod
+    def _raw_aggregates(rows, bucket_of):
+        aggregates = {}
+        for row in rows:
+            key = (row.target, bucket_of(row.ts))
+            entry = aggregates.get(key)
+            if entry is None:
+                entry = aggregates[key] = _Aggregate()
+            entry.count += 1
+            entry.success_count += 1 if row.success else 0
+            entry.sketch.add(row.latency_ms)
+        return aggregates
+
+    @staticmethod
+    def _rollup_aggregates(rows, bucket_of):
+        aggregates = {}
+        for row in rows:
+            key = (row.target, bucket_of(row.bucket))
+            entry = aggregates.get(key)
+            if entry is None:
+                entry = aggregates[key] = _Aggregate()
+            entry.add_row(row)
+        return aggregates
+
+    @staticmethod
+    def _merge(conn, table, aggregates, start, end):
+        """Write aggregates, folding in rows already stored for the same buckets"""
+        if not aggregates:
+            return
+        existing = conn.execute(select(table).where(
+            (table.c.bucket >= start) & (table.c.bucket < end))).all()
+        replaced = []
+        for row in existing:
+            entry = aggregates.get((row.target, row.bucket))
+            if entry is not None:
+                entry.add_row(row)
+                replaced.append(row.id)
+        if replaced:
+            conn.execute(delete(table).where(table.c.id.in_(replaced)))
+        rows = [entry.to_row(target, bucket) for (target, bucket), entry in aggregates.items()]
+        for i in range(0, len(rows), _ROWS_PER_STATEMENT):
+            conn.execute(table.insert().values(rows[i:i + _ROWS_PER_STATEMENT]))
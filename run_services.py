@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 """
-Entry point script to run both the web dashboard and the standalone keep-alive service.
-This script ensures maximum uptime by running both components.
+Entry point script to run the web dashboard under supervision.
+The gunicorn worker elected leader pings the configured target, so the
+standalone keep_alive.py is not started here: it would compete for the same
+leader lock and ping its own hardcoded URL instead of the configured target.
 """
 
 import os
@@ -11,6 +13,11 @@ import time
 import logging
 import signal
 import atexit
+import socket
+import random
+import selectors
+import urllib.request
+from collections import deque
 
 # Setup logging
 logging.basicConfig(
@@ -23,72 +30,301 @@ logging.basicConfig(
 )
 logger = logging.getLogger("run_services")
 
-# Process tracking
-web_app_process = None
-keep_alive_process = None
+# Child output is forwarded in batches of up to BATCH_LINES lines, at most
+# BATCH_INTERVAL seconds after the first line of the batch was read
+BATCH_LINES = 200
+BATCH_INTERVAL = 0.5
+READ_SIZE = 65536
+# Longer lines are forwarded in pieces instead of being buffered
+MAX_LINE = 16384
 
-def start_web_app():
-    """Start the Flask web application with Gunicorn"""
-    global web_app_process
-    
-    cmd = ["gunicorn", "--bind", "0.0.0.0:5000", "--reuse-port", "main:app"]
-    logger.info(f"Starting web app: {' '.join(cmd)}")
-    
-    try:
-        web_app_process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True
-        )
-        logger.info(f"Web app started with PID: {web_app_process.pid}")
+# Multiplexes every child's output pipe, exit notification and our signals
+selector = selectors.DefaultSelector()
+
+class ChildOutput:
+    """Non-blocking line reader for one child's output pipe"""
+
+    def __init__(self, name, pipe):
+        self.name = name
+        self.pipe = pipe
+        self.partial = b""
+        self.lines = []
+        self.first_line_at = None
+        os.set_blocking(pipe.fileno(), False)
+
+    def read(self):
+        """
+        Read whatever the pipe has without blocking
+
+        Returns:
+            bool: False once the pipe reached end of file
+        """
+        while True:
+            try:
+                data = os.read(self.pipe.fileno(), READ_SIZE)
+            except BlockingIOError:
+                return True
+            if not data:
+                if self.partial:
+                    self._add([self.partial])
+                    self.partial = b""
+                return False
+            *lines, self.partial = (self.partial + data).split(b"\n")
+            if len(self.partial) > MAX_LINE:
+                lines.append(self.partial)
+                self.partial = b""
+            self._add(lines)
+            if len(data) < READ_SIZE:
+                return True
+
+    def _add(self, lines):
+        if lines and not self.lines:
+            self.first_line_at = time.monotonic()
+        self.lines.extend(line.decode(errors="replace").rstrip() for line in lines)
+
+    def due(self, now):
+        """Whether the pending batch should be forwarded now"""
+        return bool(self.lines) and (len(self.lines) >= BATCH_LINES
+                                     or now - self.first_line_at >= BATCH_INTERVAL)
+
+    def flush(self):
+        """Forward the pending lines as a single log record"""
+        if self.lines:
+            logger.info("\n".join(f"[{self.name}] {line}" for line in self.lines))
+            self.lines = []
+
+    def close(self):
+        selector.unregister(self.pipe)
+        self.flush()
+        self.pipe.close()
+
+WEB_PORT = 5000
+
+# Readiness probing of children that have a ready_url
+PROBE_INTERVAL = 1.0
+PROBE_TIMEOUT = 0.5
+
+# Set by signal handlers, acted upon by the monitor loop
+reload_requested = False
+stopping = False
+
+class Child:
+    """
+    A supervised child process and its restart policy.
+
+    Unexpected exits are restarted after an exponential backoff with jitter
+    (``backoff_initial`` doubling up to ``backoff_max``); the backoff resets
+    once a child has stayed up for ``stable_after`` seconds. A child that
+    needs more than ``max_restarts`` restarts within ``restart_window``
+    seconds is considered crash-looping and left down, so a child that dies
+    on import costs a handful of forks rather than a tight fork/exec loop.
+    """
+
+    def __init__(self, name, label, cmd, restart="always", ready_url=None,
+                 ready_timeout=60.0, reload_signal=None, backoff_initial=1.0,
+                 backoff_max=60.0, stable_after=60.0, max_restarts=5,
+                 restart_window=300.0):
+        """
+        Args:
+            name (str): Short name used to prefix forwarded output
+            label (str): Human-readable name for log messages
+            cmd (list): Command line to run
+            restart (str): "always", "on-failure" (non-zero exit) or "never"
+            ready_url (str): URL that answers 200 once the child is ready
+            ready_timeout (float): Seconds to become ready before being restarted
+            reload_signal (int): Signal that makes the child reload gracefully;
+                children without one are restarted on reload instead
+            backoff_initial (float): Delay before the first restart
+            backoff_max (float): Upper bound of the restart delay
+            stable_after (float): Uptime after which the backoff resets
+            max_restarts (int): Restarts allowed within ``restart_window``
+            restart_window (float): Crash-loop detection window in seconds
+        """
+        self.name = name
+        self.label = label
+        self.cmd = cmd
+        self.restart = restart
+        self.ready_url = ready_url
+        self.ready_timeout = ready_timeout
+        self.reload_signal = reload_signal
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+
+        self.proc = None
+        self.output = None
+        self.started_at = None
+        self.ready = False
+        self.next_probe = None
+        self.restart_at = None
+        self.failures = 0
+        self.restarts = deque()
+        self.expected_exit = False
+        self.given_up = False
+
+    @property
+    def running(self):
+        return self.proc is not None and self.proc.returncode is None
+
+    @property
+    def deadline(self):
+        """Monotonic time the monitor loop next needs to act on this child"""
+        deadlines = [self.restart_at]
+        if self.running and not self.ready and self.ready_url:
+            deadlines.append(self.next_probe)
+        deadlines = [deadline for deadline in deadlines if deadline is not None]
+        return min(deadlines) if deadlines else None
+
+    def start(self):
+        """Start the child process"""
+        logger.info(f"Starting {self.label.lower()}: {' '.join(self.cmd)}")
+        self.restart_at = None
+        self.expected_exit = False
+        try:
+            self.proc = subprocess.Popen(
+                self.cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT
+            )
+        except Exception as e:
+            logger.error(f"Failed to start {self.label.lower()}: {e}")
+            self.proc = None
+            self._schedule_restart(time.monotonic())
+            return False
+        logger.info(f"{self.label} started with PID: {self.proc.pid}")
+        self.started_at = time.monotonic()
+        self.ready = self.ready_url is None
+        self.next_probe = self.started_at
+        self.output = watch_process(self)
         return True
-    except Exception as e:
-        logger.error(f"Failed to start web app: {e}")
-        return False
 
-def start_keep_alive():
-    """Start the standalone keep-alive service"""
-    global keep_alive_process
-    
-    cmd = ["python3", "keep_alive.py"]
-    logger.info(f"Starting keep-alive service: {' '.join(cmd)}")
-    
+    def stop(self, timeout=5):
+        """Terminate the child, killing it if it does not exit in time"""
+        self.restart_at = None
+        if not self.running:
+            return
+        logger.info(f"Terminating {self.label.lower()} process (PID: {self.proc.pid})")
+        try:
+            self.proc.terminate()
+            self.proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"{self.label} process did not terminate gracefully, forcing kill")
+            self.proc.kill()
+
+    def reload(self):
+        """Gracefully reload the child, or restart it if it has no reload signal"""
+        if not self.running:
+            return
+        if self.reload_signal is not None:
+            logger.info(f"Reloading {self.label.lower()} (PID: {self.proc.pid})")
+            self.proc.send_signal(self.reload_signal)
+        else:
+            logger.info(f"Restarting {self.label.lower()} (PID: {self.proc.pid})")
+            self.expected_exit = True
+            self.proc.terminate()
+
+    def exited(self):
+        """Forward the dead child's last output and apply the restart policy"""
+        output = self.output
+        if output is not None and not output.pipe.closed:
+            if output.read():
+                output.flush()
+            else:
+                output.close()
+        code = self.proc.wait()
+        if stopping:
+            return
+        now = time.monotonic()
+        if self.expected_exit:
+            self.start()
+            return
+        if self.restart == "never" or (self.restart == "on-failure" and code == 0):
+            logger.info(f"{self.label} process exited with code {code}, not restarting")
+            return
+        if now - self.started_at >= self.stable_after:
+            self.failures = 0
+        logger.warning(f"{self.label} process terminated with code {code} "
+                       f"after {now - self.started_at:.1f}s")
+        self._schedule_restart(now)
+
+    def _schedule_restart(self, now):
+        while self.restarts and now - self.restarts[0] > self.restart_window:
+            self.restarts.popleft()
+        if len(self.restarts) >= self.max_restarts:
+            self.given_up = True
+            logger.error(f"{self.label} is crash-looping ({len(self.restarts)} restarts "
+                         f"in {self.restart_window:.0f}s), giving up")
+            return
+        self.restarts.append(now)
+        delay = min(self.backoff_max, self.backoff_initial * 2 ** self.failures)
+        # Equal jitter: keeps at least half the backoff, spreads the rest
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        self.failures += 1
+        self.restart_at = now + delay
+        logger.warning(f"Restarting {self.label.lower()} in {delay:.1f}s")
+
+    def probe(self, now):
+        """Check readiness, restarting the child if it never becomes ready"""
+        if not self.running or self.ready or not self.ready_url or now < self.next_probe:
+            return
+        try:
+            with urllib.request.urlopen(self.ready_url, timeout=PROBE_TIMEOUT) as response:
+                self.ready = response.status == 200
+        except OSError:
+            pass
+        now = time.monotonic()
+        if self.ready:
+            logger.info(f"{self.label} is ready after {now - self.started_at:.1f}s")
+        elif now - self.started_at > self.ready_timeout:
+            logger.warning(f"{self.label} not ready after {self.ready_timeout:.0f}s, restarting")
+            self.proc.terminate()
+        self.next_probe = now + PROBE_INTERVAL
+
+children = [
+    Child("web_app", "Web app",
+          ["gunicorn", "--bind", f"0.0.0.0:{WEB_PORT}", "--reuse-port", "main:app"],
+          ready_url=f"http://127.0.0.1:{WEB_PORT}/api/status",
+          reload_signal=signal.SIGHUP),
+]
+
+def watch_process(child):
+    """
+    Register a child with the selector: its output pipe and, where the
+    platform supports it, a pidfd that becomes readable the moment it exits.
+    Without pidfds, exits are noticed through SIGCHLD instead.
+
+    Returns:
+        ChildOutput: Reader of the child's output
+    """
+    proc = child.proc
+    output = ChildOutput(child.name, proc.stdout)
+    selector.register(proc.stdout, selectors.EVENT_READ, ("output", output))
+    if not hasattr(os, "pidfd_open"):
+        signal.signal(signal.SIGCHLD, _wake)
+        return output
     try:
-        keep_alive_process = subprocess.Popen(
-            cmd, 
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True
-        )
-        logger.info(f"Keep-alive service started with PID: {keep_alive_process.pid}")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to start keep-alive service: {e}")
-        return False
+        pidfd = os.pidfd_open(proc.pid)
+    except OSError as e:
+        logger.warning(f"pidfd_open failed for {child.name}, relying on SIGCHLD: {e}")
+        signal.signal(signal.SIGCHLD, _wake)
+    else:
+        selector.register(pidfd, selectors.EVENT_READ, ("exit", child))
+    return output
+
+def _wake(sig, frame):
+    """No-op handler; the signal itself wakes the selector through the wakeup fd"""
 
 def cleanup():
     """Clean up processes on exit"""
+    global stopping
+    if stopping:
+        return
+    stopping = True
     logger.info("Cleaning up processes...")
-    
-    if web_app_process:
-        logger.info(f"Terminating web app process (PID: {web_app_process.pid})")
-        try:
-            web_app_process.terminate()
-            web_app_process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            logger.warning("Web app process did not terminate gracefully, forcing kill")
-            web_app_process.kill()
-    
-    if keep_alive_process:
-        logger.info(f"Terminating keep-alive process (PID: {keep_alive_process.pid})")
-        try:
-            keep_alive_process.terminate()
-            keep_alive_process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            logger.warning("Keep-alive process did not terminate gracefully, forcing kill")
-            keep_alive_process.kill()
-    
+    for child in children:
+        child.stop()
     logger.info("Cleanup complete")
 
 def signal_handler(sig, frame):
@@ -97,49 +333,96 @@ def signal_handler(sig, frame):
     cleanup()
     sys.exit(0)
 
+def reload_handler(sig, frame):
+    """Handle SIGHUP: reload gunicorn gracefully and restart the other children"""
+    global reload_requested
+    reload_requested = True
+
+def _watch_signals():
+    """Make every handled signal wake the selector"""
+    receiver, sender = socket.socketpair()
+    receiver.setblocking(False)
+    sender.setblocking(False)
+    signal.set_wakeup_fd(sender.fileno())
+    selector.register(receiver, selectors.EVENT_READ, ("signal", sender))
+
 def monitor_processes():
-    """Monitor child processes and restart them if they fail"""
-    global web_app_process, keep_alive_process
-    
+    """
+    Forward child output and supervise the children.
+
+    A single selector drains every child's pipe as soon as it has data, so
+    no child can stall on a full pipe, and wakes up the moment a child exits
+    (through its pidfd, or SIGCHLD where pidfds are unavailable), a restart
+    or readiness probe is due, or SIGHUP asks for a reload.
+    """
+    global reload_requested
+
     while True:
-        # Check web app process
-        if web_app_process and web_app_process.poll() is not None:
-            logger.warning(f"Web app process terminated with code {web_app_process.returncode}, restarting...")
-            start_web_app()
-        
-        # Check keep-alive process
-        if keep_alive_process and keep_alive_process.poll() is not None:
-            logger.warning(f"Keep-alive process terminated with code {keep_alive_process.returncode}, restarting...")
-            start_keep_alive()
-        
-        # Check process output for logging
-        for proc, name in [(web_app_process, "web_app"), (keep_alive_process, "keep_alive")]:
-            if proc:
+        outputs = [key.data[1] for key in selector.get_map().values()
+                   if key.data[0] == "output"]
+        deadlines = [output.first_line_at + BATCH_INTERVAL
+                     for output in outputs if output.lines]
+        deadlines += [child.deadline for child in children if child.deadline is not None]
+        timeout = None
+        if deadlines:
+            timeout = max(0, min(deadlines) - time.monotonic())
+
+        for key, _ in selector.select(timeout):
+            kind, item = key.data
+            if kind == "output":
+                if item.pipe.closed:
+                    continue
+                if not item.read():
+                    item.close()
+            elif kind == "exit":
+                selector.unregister(key.fd)
+                os.close(key.fd)
+                item.exited()
+            else:
                 try:
-                    # Non-blocking read from process output
-                    for line in proc.stdout:
-                        if line:
-                            logger.info(f"[{name}] {line.strip()}")
-                except Exception:
+                    key.fileobj.recv(4096)
+                except BlockingIOError:
                     pass
-        
-        # Sleep to avoid high CPU usage
-        time.sleep(5)
+                for child in children:
+                    if child.running and child.proc.poll() is not None:
+                        child.exited()
+
+        if reload_requested:
+            reload_requested = False
+            logger.info("Reload requested")
+            for child in children:
+                child.reload()
+
+        now = time.monotonic()
+        for child in children:
+            if child.restart_at is not None and now >= child.restart_at:
+                child.start()
+            child.probe(now)
+
+        if all(child.given_up for child in children):
+            logger.error("Every service is crash-looping, exiting")
+            sys.exit(1)
+
+        now = time.monotonic()
+        for key in list(selector.get_map().values()):
+            if key.data[0] == "output" and key.data[1].due(now):
+                key.data[1].flush()
 
 if __name__ == "__main__":
     # Register cleanup and signal handlers
     atexit.register(cleanup)
     signal.signal(signal.SIGTERM, signal_handler)
     signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGHUP, reload_handler)
+    _watch_signals()
     
     logger.info("Starting services manager...")
     
-    # Start both components
-    web_app_started = start_web_app()
-    keep_alive_started = start_keep_alive()
+    # Start every supervised component
+    started = [child.start() for child in children]
     
-    if not web_app_started and not keep_alive_started:
-        logger.error("Failed to start both components, exiting")
+    if not any(started):
+        logger.error("Failed to start any component, exiting")
         sys.exit(1)
     
     # Monitor and restart processes if needed
@@ -148,4 +431,4 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logger.info("Keyboard interrupt received, shutting down...")
     finally:
-        cleanup()
\ No newline at end of file
+        cleanup()
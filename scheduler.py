@@ -0,0 +1,119 @@
+import heapq
+import zlib
+import itertools
+
+class TimerHeap:
+    """
+    Min-heap of timers keyed on monotonic deadlines.
+
+    Scheduling is O(log n) and cancelling is O(1): cancelled entries are
+    only flagged and skipped when they reach the top of the heap. The heap
+    is compacted once stale entries outnumber live ones.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._stale = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def schedule(self, key, deadline):
+        """
+        Set (or move) the deadline of a timer
+
+        Args:
+            key: Hashable timer identifier
+            deadline (float): Monotonic time at which the timer is due
+        """
+        self.cancel(key)
+        entry = [deadline, next(self._counter), key, True]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+
+    def cancel(self, key):
+        """Remove a timer; returns False if it was not scheduled"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry[3] = False
+        self._stale += 1
+        if self._stale > len(self._entries) and self._stale > 64:
+            self._compact()
+        return True
+
+    def deadline_of(self, key):
+        """Deadline of a scheduled timer, or None"""
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def next_deadline(self):
+        """Earliest pending deadline, or None if no timer is scheduled"""
+        heap = self._heap
+        while heap and not heap[0][3]:
+            heapq.heappop(heap)
+            self._stale -= 1
+        return heap[0][0] if heap else None
+
+    def pop_due(self, now):
+        """
+        Remove and return every timer due at ``now``
+
+        Returns:
+            list: (key, deadline) pairs in deadline order
+        """
+        due = []
+        heap = self._heap
+        while heap and (not heap[0][3] or heap[0][0] <= now):
+            deadline, _, key, valid = heapq.heappop(heap)
+            if not valid:
+                self._stale -= 1
+                continue
+            del self._entries[key]
+            due.append((key, deadline))
+        return due
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if entry[3]]
+        heapq.heapify(self._heap)
+        self._stale = 0
+
+def next_deadline_after(deadline, interval, now):
+    """
+    Next deadline on the fixed cadence ``deadline + k * interval`` after ``now``
+
+    Keeps the schedule anchored to its original phase; missed slots (for
+    example after the process was suspended) are skipped rather than fired
+    in a burst.
+    """
+    next_deadline = deadline + interval
+    if next_deadline <= now:
+        missed = int((now - next_deadline) // interval) + 1
+        next_deadline += missed * interval
+    return next_deadline
+
+def phase_offset(key, interval, jitter=0.0):
+    """
+    Offset of a target's slots within its interval, in [0, interval)
+
+    Derived from a CRC32 of the target id, so targets are spread evenly
+    over the interval and every process agrees on each target's phase;
+    ``jitter`` (seconds) is added on top to de-synchronize replicas.
+    """
+    phase = zlib.crc32(key.encode("utf-8")) / 2 ** 32 * interval
+    return (phase + jitter) % interval
+
+def next_phase_deadline(offset, interval, now):
+    """
+    Next Unix time after ``now`` that lies ``offset`` into an interval
+    counted from the epoch, i.e. ``t % interval == offset``
+    """
+    deadline = now - now % interval + offset
+    if deadline <= now:
+        deadline += interval
+    return deadline
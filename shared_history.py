@@ -0,0 +1,600 @@
+import os
+import json
+import math
+import mmap
+import time
+import fcntl
+import struct
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from ping_stats import PingStats, STATE_BYTES
+from latency_sketch import LatencySketch
+from metrics import OUTCOMES, LATENCY_BUCKETS
+
+MAGIC = b"KAHIST04"
+
+# Header fields (byte offsets)
+_RECORD_SIZE_AT = 8
+_CAPACITY_AT = 16
+_WRITE_SEQ_AT = 24
+_CLEARED_SEQ_AT = 32
+_RUNNING_PID_AT = 40
+_STALE_AT = 48
+_VERSION_AT = 56
+_PAUSED_AT = 64
+_CONFIG_SEQ_AT = 72
+HEADER_SIZE = 128
+
+STATS_OFFSET = HEADER_SIZE
+# Length-prefixed LatencySketch.to_bytes() (room for the default 2048 bins)
+SKETCH_OFFSET = STATS_OFFSET + STATE_BYTES
+SKETCH_BYTES = 32 * 1024
+# Ping counters for /metrics: outcome counts, latency buckets and latency sum
+METRICS = struct.Struct("<%dQ%dQd" % (len(OUTCOMES), len(LATENCY_BUCKETS) + 1))
+METRICS_OFFSET = SKETCH_OFFSET + SKETCH_BYTES
+RECORDS_OFFSET = METRICS_OFFSET + METRICS.size
+
+RESPONSE_BYTES = 512
+ERROR_BYTES = 256
+TIMING_KEYS = ("dns_ms", "connect_ms", "tls_ms", "ttfb_ms", "body_ms", "total_ms")
+
+# seq, unix time, success, flags, status code, timings, timestamp,
+# response length + bytes, error length + bytes
+RECORD = struct.Struct("<QdBBH6d19sH%dsH%ds5x" % (RESPONSE_BYTES, ERROR_BYTES))
+
+_REUSED, _RESUMED = 1, 2
+_NO_TEXT = 0xFFFF
+_U64 = struct.Struct("<Q")
+_U32 = struct.Struct("<I")
+
+def _pack_text(text, limit):
+    if text is None:
+        return _NO_TEXT, b""
+    data = text.encode("utf-8")[:limit]
+    return len(data), data
+
+def _unpack_text(length, data):
+    if length == _NO_TEXT:
+        return None
+    return data[:length].decode("utf-8", errors="ignore")
+
+def encode_entry(seq, entry, when=None):
+    """
+    Pack a ping result into a fixed-size binary record
+
+    Args:
+        seq (int): Sequence number of the entry
+        entry (dict): Result dict produced by ``KeepAliveService.ping_server``
+        when (float): Unix time of the ping (defaults to now)
+    """
+    timings = entry.get("timings") or {}
+    flags = 0
+    if timings.get("reused_connection"):
+        flags |= _REUSED
+    if timings.get("tls_resumed"):
+        flags |= _RESUMED
+    response_len, response = _pack_text(entry.get("response"), RESPONSE_BYTES)
+    error_len, error = _pack_text(entry.get("error"), ERROR_BYTES)
+    return RECORD.pack(
+        seq,
+        when if when is not None else time.time(),
+        1 if entry.get("success") else 0,
+        flags,
+        entry.get("status_code") or 0,
+        *[float(timings.get(key, math.nan)) for key in TIMING_KEYS],
+        (entry.get("timestamp") or "").encode("ascii", errors="replace")[:19],
+        response_len, response, error_len, error)
+
+def decode_entry(buffer, offset=0):
+    """
+    Unpack a binary record back into a result dict
+
+    Returns:
+        tuple: (seq, unix time, entry dict)
+    """
+    fields = RECORD.unpack_from(buffer, offset)
+    seq, when, success, flags, status_code = fields[:5]
+    values = fields[5:11]
+    timestamp, response_len, response, error_len, error = fields[11:]
+    timings = None
+    if not math.isnan(values[-1]):
+        timings = {key: value for key, value in zip(TIMING_KEYS, values)
+                   if not math.isnan(value)}
+        if "ttfb_ms" in timings:
+            timings["reused_connection"] = bool(flags & _REUSED)
+            timings["tls_resumed"] = bool(flags & _RESUMED)
+    entry = {
+        "seq": seq,
+        "timestamp": timestamp.rstrip(b"\0").decode("ascii"),
+        "success": bool(success),
+        "status_code": status_code or None,
+        "response": _unpack_text(response_len, response),
+        "error": _unpack_text(error_len, error),
+        "timings": timings,
+    }
+    return seq, when, entry
+
+class SharedPingHistory:
+    """
+    Ping history kept in a memory-mapped file of fixed-size records.
+
+    The pinging process appends records and every other process on the host
+    (e.g. each gunicorn worker) maps the same file and reads it in place, so
+    all dashboards show one consistent history without any IPC per request.
+    The file also holds the ``PingStats`` counters, the latency sketch, the
+    ping counters served on /metrics, the PID of the process currently running the scheduler and whether pinging
+    was stopped from a dashboard, so any worker can ask the leader to stop
+    or resume. Settings changed from a dashboard are published in a file
+    next to it, numbered in the header, so every worker picks them up.
+
+    Offers the same interface as ``PingHistory``. Records carry their
+    sequence number, which is written last so readers can detect (and skip)
+    a slot that is being overwritten.
+    """
+
+    def __init__(self, path, capacity=100):
+        """
+        Open (or create) the shared history file
+
+        Args:
+            path (str): File backing the history
+            capacity (int): Number of records kept
+        """
+        self.path = path
+        # Settings published by any process (see publish_config)
+        self.config_path = f"{path}.config"
+        self.stats = PingStats()
+        self._lock = threading.RLock()
+        self._write_depth = 0
+        self._read_depth = 0
+        self._fd = None
+        self._mm = None
+        self._open(max(1, int(capacity)))
+
+    # -- file management -------------------------------------------------
+
+    def _open(self, capacity, allow_resize=True):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(fd, HEADER_SIZE, 0)
+            valid = (len(header) == HEADER_SIZE and header[:8] == MAGIC
+                     and _U64.unpack_from(header, _STALE_AT)[0] == 0
+                     and struct.unpack_from("<I", header, _RECORD_SIZE_AT)[0] == RECORD.size)
+            if not valid:
+                self._initialize(fd, capacity)
+            self._map(fd)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        if allow_resize and self.capacity != capacity:
+            self.resize(capacity)
+
+    def _initialize(self, fd, capacity, entries=(), stats=None, write_seq=0, sketch=None):
+        """Write a fresh header, counters, sketch and records into ``fd``"""
+        os.ftruncate(fd, 0)
+        os.ftruncate(fd, RECORDS_OFFSET + capacity * RECORD.size)
+        header = bytearray(HEADER_SIZE)
+        header[:8] = MAGIC
+        struct.pack_into("<I", header, _RECORD_SIZE_AT, RECORD.size)
+        _U64.pack_into(header, _CAPACITY_AT, capacity)
+        _U64.pack_into(header, _WRITE_SEQ_AT, write_seq)
+        _U64.pack_into(header, _CLEARED_SEQ_AT, write_seq - len(entries))
+        os.pwrite(fd, bytes(header), 0)
+        if stats is not None:
+            os.pwrite(fd, stats, STATS_OFFSET)
+        if sketch is not None:
+            os.pwrite(fd, sketch, SKETCH_OFFSET)
+        for seq, record in entries:
+            os.pwrite(fd, record, RECORDS_OFFSET + (seq % capacity) * RECORD.size)
+
+    def _map(self, fd):
+        old_fd, old_mm = self._fd, self._mm
+        self._fd = fd
+        self._mm = mmap.mmap(fd, 0)
+        self.capacity = _U64.unpack_from(self._mm, _CAPACITY_AT)[0]
+        self.stats.rebind(memoryview(self._mm)[STATS_OFFSET:SKETCH_OFFSET])
+        if old_mm is not None:
+            try:
+                old_mm.close()
+            except BufferError:
+                # A reader still holds a view; unmapped once it is dropped
+                pass
+        if old_fd is not None:
+            os.close(old_fd)
+
+    def _refresh(self):
+        """Re-open the file if another process replaced it (after a resize)"""
+        if _U64.unpack_from(self._mm, _STALE_AT)[0]:
+            self._open(self.capacity, allow_resize=False)
+
+    def _get(self, at):
+        return _U64.unpack_from(self._mm, at)[0]
+
+    def _set(self, at, value):
+        _U64.pack_into(self._mm, at, value)
+
+    def _bump_version(self):
+        self._set(_VERSION_AT, self._get(_VERSION_AT) + 1)
+
+    def _bounds(self):
+        """(first, end) sequence numbers of the retained records"""
+        write_seq = self._get(_WRITE_SEQ_AT)
+        first = max(self._get(_CLEARED_SEQ_AT), write_seq - self.capacity, 0)
+        return first, write_seq
+
+    def _read(self, seq):
+        """Decode the record with sequence ``seq``; None if it was overwritten"""
+        offset = RECORDS_OFFSET + (seq % self.capacity) * RECORD.size
+        if _U64.unpack_from(self._mm, offset)[0] != seq:
+            return None
+        record_seq, _, entry = decode_entry(self._mm[offset:offset + RECORD.size])
+        if record_seq != seq or _U64.unpack_from(self._mm, offset)[0] != seq:
+            return None
+        return entry
+
+    @contextmanager
+    def write_lock(self):
+        """Serialize writers across processes (re-entrant within a process)"""
+        with self._lock:
+            if self._read_depth and not self._write_depth:
+                # flock would turn the shared lock into an exclusive one and
+                # drop it altogether on release
+                raise RuntimeError("write_lock() cannot be taken inside read_lock()")
+            if self._write_depth == 0:
+                while True:
+                    self._refresh()
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+                    if not self._get(_STALE_AT):
+                        break
+                    # Resized by another process while we waited; lock the new file
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._write_depth += 1
+            try:
+                yield
+            finally:
+                self._write_depth -= 1
+                if self._write_depth == 0:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def read_lock(self):
+        """
+        Hold off writers while several fields are read together
+
+        Takes a shared ``flock``, so readers in different processes do not
+        wait for each other, only for a writer. Re-entrant, also inside
+        ``write_lock``.
+        """
+        with self._lock:
+            locking = not (self._write_depth or self._read_depth)
+            if locking:
+                while True:
+                    self._refresh()
+                    fcntl.flock(self._fd, fcntl.LOCK_SH)
+                    if not self._get(_STALE_AT):
+                        break
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._read_depth += 1
+            try:
+                yield
+            finally:
+                self._read_depth -= 1
+                if locking:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    # -- PingHistory interface -------------------------------------------
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            first, end = self._bounds()
+            return end - first
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __getitem__(self, index):
+        with self._lock:
+            self._refresh()
+            first, end = self._bounds()
+            size = end - first
+            if isinstance(index, slice):
+                return [self._read(first + i) for i in range(*index.indices(size))]
+            if index < 0:
+                index += size
+            if not 0 <= index < size:
+                raise IndexError("history index out of range")
+            return self._read(first + index)
+
+    def __iter__(self):
+        for entry in self[:]:
+            yield entry
+
+    def __reversed__(self):
+        return self.older_than()
+
+    @property
+    def version(self):
+        """Counter bumped by every change to the history or the running PID"""
+        with self._lock:
+            self._refresh()
+            return self._get(_VERSION_AT)
+
+    @property
+    def last_seq(self):
+        """Sequence number of the newest record (-1 if none was ever written)"""
+        with self._lock:
+            self._refresh()
+            return self._get(_WRITE_SEQ_AT) - 1
+
+    def since(self, seq, limit=None):
+        """Entries newer than ``seq``, oldest first (the newest ``limit`` of them)"""
+        with self._lock:
+            self._refresh()
+            first, end = self._bounds()
+            start = max(first, seq + 1)
+            if limit is not None:
+                start = max(start, end - limit)
+            return [entry for entry in (self._read(s) for s in range(start, end))
+                    if entry is not None]
+
+    def older_than(self, seq=None):
+        """Iterate newest to oldest over entries with a sequence number below ``seq``"""
+        with self._lock:
+            self._refresh()
+            first, end = self._bounds()
+        start = end if seq is None else min(end, seq)
+        for current in range(start - 1, first - 1, -1):
+            with self._lock:
+                self._refresh()
+                if current < self._bounds()[0]:
+                    return  # overwritten or cleared meanwhile
+                entry = self._read(current)
+            if entry is not None:
+                yield entry
+
+    def append(self, entry):
+        """
+        Append an entry, overwriting the oldest record when full
+
+        Returns:
+            The evicted entry, or None if nothing was evicted
+        """
+        with self.write_lock():
+            first, end = self._bounds()
+            evicted = self._read(end - self.capacity) if end - first >= self.capacity else None
+            offset = RECORDS_OFFSET + (end % self.capacity) * RECORD.size
+            entry["seq"] = end
+            record = encode_entry(end, entry)
+            # Invalidate the slot, write the body, then publish the sequence
+            self._mm[offset:offset + 8] = bytes(8)
+            self._mm[offset + 8:offset + RECORD.size] = record[8:]
+            self._mm[offset:offset + 8] = record[:8]
+            self._set(_WRITE_SEQ_AT, end + 1)
+            self._bump_version()
+            return evicted
+
+    def raw_records(self):
+        """
+        The retained records as packed by ``encode_entry``, oldest first
+
+        Only the record area is copied under the lock; the records are put
+        in order (and the ring unwrapped) after it is released, so a bulk
+        save does not hold up the pinging process.
+
+        Returns:
+            bytes: ``RECORD.size`` bytes per entry
+        """
+        with self.read_lock():
+            first, end = self._bounds()
+            capacity = self.capacity
+            area = self._mm[RECORDS_OFFSET:RECORDS_OFFSET + capacity * RECORD.size]
+        start = (first % capacity) * RECORD.size
+        stop = start + (end - first) * RECORD.size
+        if stop <= len(area):
+            return area[start:stop]
+        return area[start:] + area[:stop - len(area)]
+
+    def touch(self):
+        """
+        Bump the version for a change outside the records (e.g. new
+        settings), so every process's readers see a new state
+        """
+        with self.write_lock():
+            self._bump_version()
+
+    def clear(self):
+        """Hide every existing record"""
+        with self.write_lock():
+            self._set(_CLEARED_SEQ_AT, self._get(_WRITE_SEQ_AT))
+            self._bump_version()
+
+    def resize(self, capacity):
+        """
+        Replace the file with one of a different capacity, keeping the newest
+        records; other processes pick up the new file on their next access
+
+        Returns:
+            list: Entries dropped because they no longer fit (oldest first)
+        """
+        capacity = max(1, int(capacity))
+        with self.write_lock():
+            if capacity == self.capacity:
+                return []
+            first, end = self._bounds()
+            keep_from = max(first, end - capacity)
+            dropped = [e for e in (self._read(seq) for seq in range(first, keep_from)) if e]
+            kept = []
+            for seq in range(keep_from, end):
+                offset = RECORDS_OFFSET + (seq % self.capacity) * RECORD.size
+                kept.append((seq, self._mm[offset:offset + RECORD.size]))
+            stats = self.stats.to_bytes()
+            # The sketch and the ping counters after it
+            sketch = self._mm[SKETCH_OFFSET:RECORDS_OFFSET]
+            running_pid = self._get(_RUNNING_PID_AT)
+            paused = self._get(_PAUSED_AT)
+            config_seq = self._get(_CONFIG_SEQ_AT)
+            version = self._get(_VERSION_AT) + 1
+
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            self._initialize(fd, capacity, kept, stats, end, sketch)
+            os.pwrite(fd, _U64.pack(running_pid), _RUNNING_PID_AT)
+            os.pwrite(fd, _U64.pack(paused), _PAUSED_AT)
+            os.pwrite(fd, _U64.pack(config_seq), _CONFIG_SEQ_AT)
+            os.pwrite(fd, _U64.pack(version), _VERSION_AT)
+            os.replace(tmp_path, self.path)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            old_fd = self._fd
+            self._set(_STALE_AT, 1)
+            fcntl.flock(old_fd, fcntl.LOCK_UN)
+            self._map(fd)
+            return dropped
+
+    # -- latency sketch --------------------------------------------------
+
+    def read_sketch(self):
+        """Return a copy of the shared latency sketch"""
+        with self.read_lock():
+            size = _U32.unpack_from(self._mm, SKETCH_OFFSET)[0]
+            if not size:
+                return LatencySketch()
+            start = SKETCH_OFFSET + _U32.size
+            return LatencySketch.from_bytes(self._mm[start:start + size])
+
+    def write_sketch(self, sketch):
+        """Replace the shared latency sketch"""
+        data = sketch.to_bytes()
+        if len(data) > SKETCH_BYTES - _U32.size:
+            raise ValueError("Latency sketch does not fit in the shared history file")
+        with self.write_lock():
+            start = SKETCH_OFFSET + _U32.size
+            self._mm[start:start + len(data)] = data
+            _U32.pack_into(self._mm, SKETCH_OFFSET, len(data))
+
+    # -- ping counters ---------------------------------------------------
+
+    def count_ping(self, outcome, latency=None):
+        """
+        Count one ping in the counters every process reports
+
+        Args:
+            outcome (str): One of ``metrics.OUTCOMES``
+            latency (float): Total time of the ping in seconds, if it got a response
+        """
+        with self.write_lock():
+            values = list(METRICS.unpack_from(self._mm, METRICS_OFFSET))
+            values[OUTCOMES.index(outcome)] += 1
+            if latency is not None:
+                values[len(OUTCOMES) + bisect_left(LATENCY_BUCKETS, latency)] += 1
+                values[-1] += latency
+            METRICS.pack_into(self._mm, METRICS_OFFSET, *values)
+
+    def ping_counts(self):
+        """
+        Returns:
+            dict: ``{"outcomes": {...}, "buckets": [...], "sum": float}``, as
+            one target of ``PingMetrics.collect()``
+        """
+        with self.read_lock():
+            values = METRICS.unpack_from(self._mm, METRICS_OFFSET)
+        return {
+            "outcomes": dict(zip(OUTCOMES, values[:len(OUTCOMES)])),
+            "buckets": list(values[len(OUTCOMES):-1]),
+            "sum": values[-1],
+        }
+
+    # -- scheduler ownership ---------------------------------------------
+
+    def set_running(self, running):
+        """Record whether this process is currently running the pings"""
+        with self.write_lock():
+            self._set(_RUNNING_PID_AT, os.getpid() if running else 0)
+            self._bump_version()
+
+    @property
+    def paused(self):
+        """Whether pinging was stopped on request (by any process)"""
+        with self._lock:
+            self._refresh()
+            return bool(self._get(_PAUSED_AT))
+
+    def set_paused(self, paused):
+        """Ask whichever process leads to stop (True) or resume (False) pinging"""
+        with self.write_lock():
+            self._set(_PAUSED_AT, 1 if paused else 0)
+            self._bump_version()
+
+    # -- published settings ----------------------------------------------
+
+    @property
+    def config_seq(self):
+        """Number of the last settings published (0 if none were)"""
+        with self._lock:
+            self._refresh()
+            return self._get(_CONFIG_SEQ_AT)
+
+    def _load_config(self):
+        """Published settings (caller holds the write lock); None if unreadable"""
+        if not self._get(_CONFIG_SEQ_AT):
+            return None
+        try:
+            with open(self.config_path, "rb") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def publish_config(self, changes, base=None):
+        """
+        Merge ``changes`` into the settings published for every process
+
+        The settings live in a small JSON file next to the history; the
+        sequence number in the header tells readers when it changed.
+
+        Args:
+            changes (dict): JSON-serializable settings to change
+            base: Configuration the changes apply to, stored as ``"base"``;
+                settings published against another base (e.g. by an earlier
+                deployment) are replaced rather than merged
+
+        Returns:
+            int: Sequence number of this publication
+        """
+        with self.write_lock():
+            settings = self._load_config() or {}
+            if settings.get("base") != base:
+                settings = {}
+            settings.update(changes, base=base)
+            tmp_path = f"{self.config_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(settings, f)
+            os.replace(tmp_path, self.config_path)
+            seq = self._get(_CONFIG_SEQ_AT) + 1
+            self._set(_CONFIG_SEQ_AT, seq)
+            self._bump_version()
+            return seq
+
+    def read_config(self):
+        """
+        Returns:
+            tuple: (sequence number, published settings or None)
+        """
+        with self.read_lock():
+            return self._get(_CONFIG_SEQ_AT), self._load_config()
+
+    def running_pid(self):
+        """PID of the live process running the pings, or None"""
+        with self._lock:
+            self._refresh()
+            pid = self._get(_RUNNING_PID_AT)
+        if not pid:
+            return None
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return None
+        except PermissionError:
+            pass
+        return pid
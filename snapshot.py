@@ -0,0 +1,179 @@
+import os
+import math
+import zlib
+import atexit
+import struct
+import logging
+import threading
+
+from shared_history import RECORD, decode_entry
+from latency_sketch import LatencySketch
+
+MAGIC = b"KASNAP01"
+
+# Section of one target: target id length, next ping (Unix time, NaN if not
+# scheduled), interval, counter state length, sketch length, entry count;
+# followed by the target id, counters, sketch and fixed-size history records
+_SECTION = struct.Struct("<HddIII")
+
+class Checkpointer:
+    """
+    Periodically saves a warm-start snapshot of every registered service.
+
+    A snapshot holds each target's history buffer, counters, latency sketch
+    and next scheduled ping. It is written to a temporary file, compressed
+    (the fixed-size records are mostly padding), and renamed over the
+    previous one, so a crash never leaves a torn snapshot behind.
+
+    After a restart the file is only read when the first service asks for
+    its state, and only that service's section is decoded.
+    """
+
+    def __init__(self, path, interval=60):
+        """
+        Args:
+            path (str): Snapshot file
+            interval (float): Seconds between snapshots of the background thread
+        """
+        self.path = path
+        self.interval = interval
+        self.logger = logging.getLogger("keep_alive.snapshot")
+        self.thread = None
+        self._services = []
+        self._sections = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def add(self, service):
+        """Include a service (anything with ``checkpoint()``) in the snapshots"""
+        with self._lock:
+            if service not in self._services:
+                self._services.append(service)
+
+    def start(self):
+        """Write snapshots periodically in a background thread"""
+        if self.thread is not None and self.thread.is_alive():
+            return False
+        self._stopped.clear()
+        self.thread = threading.Thread(target=self._run, name="keep_alive_snapshot")
+        self.thread.daemon = True
+        self.thread.start()
+        return True
+
+    def stop(self):
+        """Stop the background thread, writing a last snapshot if it was running"""
+        if self.thread is None or not self.thread.is_alive():
+            return False
+        self._stopped.set()
+        self.thread.join(timeout=10)
+        self.write()
+        return True
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        """Save the state of every registered service now"""
+        with self._lock:
+            services = list(self._services)
+        try:
+            body = b"".join(_encode_section(**service.checkpoint()) for service in services)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(MAGIC + zlib.compress(body, 1))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self.logger.error(f"Error writing snapshot: {e}")
+            return False
+        return True
+
+    def restore(self, target):
+        """
+        Saved state of a target, read from the snapshot file on first use
+
+        Returns:
+            dict: entries, stats, latency, next_ping and interval of the
+            target, or None if the snapshot has nothing for it
+        """
+        with self._lock:
+            if self._sections is None:
+                self._sections = self._read()
+            section = self._sections.get(target)
+        return _decode_section(*section) if section is not None else None
+
+    def _read(self):
+        """Map each target in the snapshot file to its section (not yet decoded)"""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return {}
+        except OSError as e:
+            self.logger.error(f"Error reading snapshot: {e}")
+            return {}
+        if data[:len(MAGIC)] != MAGIC:
+            self.logger.warning(f"Ignoring {self.path}: not a snapshot file")
+            return {}
+        try:
+            body = zlib.decompress(data[len(MAGIC):])
+        except zlib.error as e:
+            self.logger.error(f"Ignoring corrupt snapshot {self.path}: {e}")
+            return {}
+        sections = {}
+        offset = 0
+        while offset + _SECTION.size <= len(body):
+            header = _SECTION.unpack_from(body, offset)
+            target_length, _, _, stats_length, sketch_length, count = header
+            start = offset + _SECTION.size
+            target = body[start:start + target_length].decode("utf-8")
+            sections[target] = (body, start + target_length, header)
+            offset = (start + target_length + stats_length + sketch_length
+                      + count * RECORD.size)
+        return sections
+
+def _encode_section(target, records, stats, latency, next_ping, interval):
+    """``records`` are the history entries packed by ``encode_entry``, oldest first"""
+    target = target.encode("utf-8")[:0xFFFF]
+    sketch = latency.to_bytes()
+    header = _SECTION.pack(len(target), next_ping if next_ping is not None else math.nan,
+                           interval, len(stats), len(sketch), len(records) // RECORD.size)
+    return header + target + stats + sketch + records
+
+def _decode_section(body, offset, header):
+    _, next_ping, interval, stats_length, sketch_length, count = header
+    stats = body[offset:offset + stats_length]
+    offset += stats_length
+    latency = LatencySketch.from_bytes(body[offset:offset + sketch_length])
+    offset += sketch_length
+    entries = []
+    for i in range(count):
+        entries.append(decode_entry(body, offset + i * RECORD.size)[2])
+    return {
+        "entries": entries,
+        "stats": stats,
+        "latency": latency,
+        "next_ping": None if math.isnan(next_ping) else next_ping,
+        "interval": interval,
+    }
+
+# Shared checkpointers used by every KeepAliveService in the process, one per file
+_checkpointers = {}
+_checkpointers_lock = threading.Lock()
+
+def get_checkpointer(path, interval=None):
+    """
+    Return the process-wide checkpointer for a snapshot file, creating it on first use
+
+    A last snapshot is written at exit if the checkpointer was started.
+    """
+    path = os.path.abspath(path)
+    with _checkpointers_lock:
+        checkpointer = _checkpointers.get(path)
+        if checkpointer is None:
+            checkpointer = Checkpointer(path, interval if interval is not None else 60)
+            _checkpointers[path] = checkpointer
+            atexit.register(checkpointer.stop)
+        return checkpointer
@@ -0,0 +1,74 @@
+import copy
+from types import MappingProxyType
+from request_template import PreparedPing
+
+class TargetConfig:
+    """
+    Immutable snapshot of one target's ping settings.
+
+    A service holds a reference to its current snapshot and swaps it for a
+    new one on reconfiguration. A ping reads the reference once and uses
+    that snapshot throughout, so it never sees half of an update, and
+    neither the pinging threads nor the updater need a lock.
+    """
+
+    __slots__ = ("url", "name", "method", "headers", "data", "interval",
+                 "response_limit", "version", "prepared")
+
+    def __init__(self, url, name=None, method='POST', headers=None, data=None,
+                 interval=180, response_limit=1000, version=0):
+        """
+        Args:
+            url (str): Target URL
+            name (str): Identifier results are stored under (defaults to the URL)
+            method (str): HTTP method
+            headers (dict): Request headers
+            data: Payload (dict, string or None)
+            interval (float): Seconds between pings
+            response_limit (int): Bytes of each response body to keep
+            version (int): Number of the configuration change this snapshot reflects
+        """
+        set_field = object.__setattr__
+        set_field(self, "url", url)
+        set_field(self, "name", name)
+        set_field(self, "method", (method or 'POST').upper())
+        set_field(self, "headers", MappingProxyType(dict(headers or {})))
+        set_field(self, "data", copy.deepcopy(data))
+        set_field(self, "interval", interval)
+        set_field(self, "response_limit", response_limit)
+        set_field(self, "version", version)
+        # Method, headers and body are encoded once per snapshot
+        set_field(self, "prepared", PreparedPing(self.method, self.headers, self.data, version))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("TargetConfig is immutable; use replace()")
+
+    def __delattr__(self, name):
+        raise AttributeError("TargetConfig is immutable")
+
+    @classmethod
+    def from_config(cls, config, version=0):
+        """Build a snapshot from a configuration dict"""
+        return cls(config['url'], config.get('name'), config.get('method', 'POST'),
+                   config.get('headers'), config.get('data'), config['interval'],
+                   config.get('response_limit', 1000), version)
+
+    def replace(self, config):
+        """
+        New snapshot with the settings present in ``config`` changed
+
+        Args:
+            config (dict): Settings to change; missing keys keep their value
+
+        Returns:
+            TargetConfig: The next version of this snapshot
+        """
+        return TargetConfig(
+            config.get('url', self.url),
+            config.get('name', self.name),
+            config.get('method', self.method),
+            config.get('headers', self.headers),
+            config.get('data', self.data),
+            config.get('interval', self.interval),
+            config.get('response_limit', self.response_limit),
+            self.version + 1)
@@ -0,0 +1,65 @@
+import random
+import unittest
+
+from interval_tuner import IntervalTuner
+
+class SimulatedHost:
+    """Answers fast while warm and slowly after sleeping for ``idle_timeout`` seconds"""
+
+    def __init__(self, idle_timeout, seed=25):
+        self.idle_timeout = idle_timeout
+        self.rng = random.Random(seed)
+
+    def latency_ms(self, gap):
+        if gap is not None and gap >= self.idle_timeout:
+            return self.rng.uniform(4000, 9000)
+        return self.rng.lognormvariate(4, 0.3)
+
+def _run(tuner, host, pings):
+    """Ping at the tuner's interval; returns (gap, cold) per ping"""
+    history = []
+    gap = None
+    for _ in range(pings):
+        latency = host.latency_ms(gap)
+        cold = tuner.is_cold(latency)
+        tuner.observe(gap, latency)
+        history.append((gap, cold))
+        gap = tuner.interval
+    return history
+
+class IntervalTunerTest(unittest.TestCase):
+    def test_converges_below_the_idle_timeout(self):
+        for idle_timeout in (300, 900, 1500):
+            tuner = IntervalTuner(60, min_interval=60, max_interval=3600, margin=0.8)
+            history = _run(tuner, SimulatedHost(idle_timeout), 200)
+            self.assertLess(tuner.interval, idle_timeout)
+            self.assertGreaterEqual(tuner.interval, 0.8 * 0.8 * idle_timeout)
+            # Once settled the target never goes cold again
+            self.assertFalse(any(cold for _, cold in history[-100:]), idle_timeout)
+
+    def test_stays_at_the_maximum_without_cold_starts(self):
+        tuner = IntervalTuner(60, max_interval=1200)
+        history = _run(tuner, SimulatedHost(idle_timeout=10 ** 9), 100)
+        self.assertEqual(tuner.interval, 1200)
+        self.assertEqual(tuner.cold_starts, 0)
+        self.assertFalse(any(cold for _, cold in history))
+
+    def test_never_below_the_minimum(self):
+        tuner = IntervalTuner(120, min_interval=60)
+        _run(tuner, SimulatedHost(idle_timeout=30), 100)
+        self.assertEqual(tuner.interval, 60)
+
+    def test_follows_a_longer_idle_timeout(self):
+        tuner = IntervalTuner(60, max_interval=3600)
+        host = SimulatedHost(idle_timeout=600)
+        _run(tuner, host, 150)
+        self.assertLess(tuner.interval, 600)
+        host.idle_timeout = 2000
+        # A warm answer past the old limit lifts it
+        tuner.observe(tuner.limit, host.latency_ms(tuner.limit))
+        _run(tuner, host, 200)
+        self.assertGreater(tuner.interval, 600)
+        self.assertLess(tuner.interval, 2000)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import random
+import unittest
+
+from latency_sketch import LatencySketch
+
+def _sketch(values, **kwargs):
+    sketch = LatencySketch(**kwargs)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+class LatencySketchMergeTest(unittest.TestCase):
+    def _values(self, seed, n=3000):
+        rng = random.Random(seed)
+        # Mostly warm pings, some cold starts, a few sub-microsecond values
+        return [rng.choice((rng.lognormvariate(4, 0.5), rng.lognormvariate(8, 0.3), 0.0))
+                for _ in range(n)]
+
+    def assertSameSketch(self, merged, combined):
+        self.assertEqual(merged.bins, combined.bins)
+        self.assertEqual(merged.zero_count, combined.zero_count)
+        self.assertEqual(merged.count, combined.count)
+        self.assertEqual((merged.min, merged.max), (combined.min, combined.max))
+        self.assertAlmostEqual(merged.sum, combined.sum, places=6)
+        for q in (0, 0.01, 0.5, 0.9, 0.95, 0.99, 1):
+            self.assertEqual(merged.quantile(q), combined.quantile(q))
+
+    def test_merge_equals_sketch_of_combined_values(self):
+        for seed in range(5):
+            parts = [self._values(seed * 10 + i) for i in range(3)]
+            merged = LatencySketch()
+            for part in parts:
+                merged.merge(_sketch(part))
+            self.assertSameSketch(merged, _sketch(sum(parts, [])))
+
+    def test_merge_with_collapsed_bins(self):
+        parts = [self._values(i) for i in range(4)]
+        merged = LatencySketch(max_bins=20)
+        for part in parts:
+            merged.merge(_sketch(part, max_bins=20))
+        self.assertLessEqual(len(merged.bins), 20)
+        self.assertSameSketch(merged, _sketch(sum(parts, []), max_bins=20))
+
+    def test_merge_survives_serialization(self):
+        parts = [self._values(i) for i in range(3)]
+        merged = LatencySketch()
+        for part in parts:
+            merged.merge(LatencySketch.from_bytes(_sketch(part).to_bytes()))
+        self.assertSameSketch(merged, _sketch(sum(parts, [])))
+
+    def test_quantiles_within_relative_accuracy(self):
+        values = sorted(v for v in self._values(1) if v > 0)
+        sketch = _sketch(values)
+        for q in (0.5, 0.9, 0.99):
+            exact = values[int(q * (len(values) - 1))]
+            self.assertLessEqual(abs(sketch.quantile(q) - exact), 0.01 * exact + 1e-9)
+
+    def test_merge_rejects_other_accuracy(self):
+        with self.assertRaises(ValueError):
+            LatencySketch(0.01).merge(_sketch([1.0], relative_accuracy=0.02))
+
+if __name__ == "__main__":
+    unittest.main()
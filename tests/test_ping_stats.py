@@ -0,0 +1,52 @@
+import random
+import unittest
+
+from ping_stats import PingStats, HOUR_MINUTES, DAY_MINUTES
+
+class PingStatsWindowTest(unittest.TestCase):
+    """Sliding windows checked against a brute-force count of every ping"""
+
+    def _expected(self, pings, now, minutes):
+        now_minute = int(now // 60)
+        inside = [success for when, success in pings
+                  if now_minute - minutes < int(when // 60) <= now_minute]
+        return len(inside), sum(inside)
+
+    def _check(self, stats, pings, now):
+        snapshot = stats.snapshot(now)
+        for name, minutes in (("last_hour", HOUR_MINUTES), ("last_24h", DAY_MINUTES)):
+            count, success = self._expected(pings, now, minutes)
+            self.assertEqual((snapshot[name]["count"], snapshot[name]["success_count"]),
+                             (count, success), f"{name} at {now}")
+        self.assertEqual(snapshot["all_time"]["count"], len(pings))
+
+    def test_fuzz_against_brute_force(self):
+        rng = random.Random(4)
+        for _ in range(20):
+            stats = PingStats()
+            pings = []
+            now = 1_700_000_000.0
+            for _ in range(300):
+                # Mostly steady pings, with idle gaps up to past the 24h window
+                now += rng.choice((0, rng.uniform(1, 120), rng.uniform(60, 7200),
+                                   rng.uniform(3600, 2 * 86400)))
+                when = now
+                if pings and rng.random() < 0.2:
+                    # Recorded late, e.g. a slow ping finishing after a newer one
+                    when = now - rng.uniform(0, 3 * 3600)
+                success = rng.random() < 0.7
+                stats.record(success, when)
+                pings.append((when, success))
+                self._check(stats, pings, now + rng.choice((0, rng.uniform(0, 2 * 86400))))
+
+    def test_reads_do_not_move_the_window(self):
+        stats = PingStats()
+        stats.record(True, 0.0)
+        self.assertEqual(stats.snapshot(2 * 86400.0)["last_24h"]["count"], 0)
+        stats.record(False, 60.0)
+        snapshot = stats.snapshot(60.0)
+        self.assertEqual(snapshot["last_hour"]["count"], 2)
+        self.assertEqual(snapshot["last_hour"]["success_count"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import gzip
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_sessions import SessionPool, read_capped
+from keep_alive_service import KeepAliveService
+
+class _Handler(BaseHTTPRequestHandler):
+    # path -> (status, headers, body, declared Content-Length or None)
+    routes = {}
+
+    def do_GET(self):
+        status, headers, body, length = self.routes[self.path]
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(length if length is not None else len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class ReadCappedTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        _Handler.routes = {
+            # An HTML splash page well past the cap
+            "/gzip": (503, {"Content-Encoding": "gzip"},
+                      gzip.compress(os.urandom(50000).hex().encode()), None),
+            # Promises 100000 bytes and sends 10
+            "/short": (200, {}, b"x" * 10, 100000),
+        }
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+        cls.tmp = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.tmp.cleanup()
+
+    def test_truncates_gzip_body(self):
+        pool = SessionPool()
+        response = pool.request("GET", self.base + "/gzip", stream=True)
+        text, truncated = read_capped(response, 1000)
+        self.assertTrue(truncated)
+        self.assertEqual(len(text), 1000)
+        pool.close()
+
+    def test_short_body_is_a_failed_ping(self):
+        service = KeepAliveService({
+            "url": self.base + "/short", "method": "GET", "headers": {}, "data": None,
+            "interval": 60, "log_file": os.path.join(self.tmp.name, "keep_alive.log"),
+        }, sessions=SessionPool())
+        result = service.ping_server()
+        self.assertFalse(result["success"])
+        self.assertIn("IncompleteRead", result["error"])
+        self.assertEqual(len(service.ping_history), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+
+from ping_store import PingStore
+from rollup import RollupJob, DAY
+
+NOW = 1767225600.0  # 2026-01-01 00:00 UTC
+TARGET = "https://example.com/ping"
+
+class RollupsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = PingStore("sqlite:///" + os.path.join(self.tmp.name, "pings.db"))
+        # Hourly pings over 40 days: raw, minute and hour tiers once rolled up
+        self.pings = 0
+        for i in range(40 * 24):
+            when = NOW - 40 * DAY + i * 3600 + 90
+            success = i % 5 != 0
+            self.store.add(TARGET, {
+                "success": success,
+                "status_code": 200 if success else 503,
+                "timings": {"total_ms": 100.0 + i % 7},
+            }, when)
+            self.pings += 1
+        self.store.flush()
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def _totals(self, resolution="hour"):
+        buckets = self.store.rollups(TARGET, NOW - 60 * DAY, NOW, resolution)
+        return (sum(b["count"] for b in buckets),
+                sum(b["success_count"] for b in buckets),
+                sum(b["latency"]["count"] for b in buckets))
+
+    def test_counts_every_tier(self):
+        before = self._totals()
+        self.assertEqual(before[0], self.pings)
+
+        summary = RollupJob(self.store, 7 * DAY, 30 * DAY).run_once(NOW)
+        self.assertGreater(summary["raw_rows"], 0)
+        self.assertGreater(summary["minute_rows"], 0)
+        self.assertEqual(self._totals(), before)
+        self.assertEqual(self._totals("minute"), before)
+
+    def test_hour_buckets_match_after_rollup(self):
+        before = self.store.rollups(TARGET, NOW - 60 * DAY, NOW)
+        RollupJob(self.store, 7 * DAY, 30 * DAY).run_once(NOW)
+        after = self.store.rollups(TARGET, NOW - 60 * DAY, NOW)
+        self.assertEqual([(b["bucket"], b["count"], b["success_count"]) for b in before],
+                         [(b["bucket"], b["count"], b["success_count"]) for b in after])
+
+    def test_window_bounds(self):
+        RollupJob(self.store, 7 * DAY, 30 * DAY).run_once(NOW)
+        buckets = self.store.rollups(TARGET, NOW - 35 * DAY, NOW - 5 * DAY)
+        self.assertEqual(sum(b["count"] for b in buckets), 30 * 24)
+        self.assertTrue(all(NOW - 35 * DAY <= b["bucket"] < NOW - 5 * DAY for b in buckets))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import random
+import unittest
+
+from scheduler import TimerHeap
+
+class TimerHeapTest(unittest.TestCase):
+    def test_pops_due_timers_in_deadline_order(self):
+        timers = TimerHeap()
+        timers.schedule("b", 2.0)
+        timers.schedule("a", 1.0)
+        timers.schedule("c", 3.0)
+        self.assertEqual(timers.pop_due(2.0), [("a", 1.0), ("b", 2.0)])
+        self.assertEqual(len(timers), 1)
+        self.assertEqual(timers.next_deadline(), 3.0)
+
+    def test_reschedule_replaces_the_old_deadline(self):
+        timers = TimerHeap()
+        timers.schedule("a", 1.0)
+        timers.schedule("a", 5.0)
+        self.assertEqual(timers.pop_due(4.0), [])
+        self.assertEqual(timers.deadline_of("a"), 5.0)
+        self.assertEqual(timers.pop_due(5.0), [("a", 5.0)])
+        self.assertNotIn("a", timers)
+
+    def test_cancel(self):
+        timers = TimerHeap()
+        timers.schedule("a", 1.0)
+        timers.schedule("b", 2.0)
+        self.assertTrue(timers.cancel("a"))
+        self.assertFalse(timers.cancel("a"))
+        self.assertIsNone(timers.deadline_of("a"))
+        self.assertEqual(timers.next_deadline(), 2.0)
+        self.assertEqual(timers.pop_due(10.0), [("b", 2.0)])
+        self.assertIsNone(timers.next_deadline())
+
+    def test_compaction_bounds_stale_entries(self):
+        timers = TimerHeap()
+        for i in range(10):
+            timers.schedule(i, float(i))
+        for _ in range(50):
+            for i in range(10):
+                timers.schedule(i, float(i))
+        # Stale entries never outnumber live ones by more than the threshold
+        self.assertLessEqual(len(timers._heap), 10 + 64 + 1)
+        self.assertEqual([key for key, _ in timers.pop_due(100.0)], list(range(10)))
+        self.assertEqual(len(timers._heap), 0)
+
+    def test_random_operations_match_a_dict(self):
+        rng = random.Random(8)
+        timers = TimerHeap()
+        expected = {}
+        now = 0.0
+        for _ in range(5000):
+            key = rng.randrange(50)
+            action = rng.random()
+            if action < 0.5:
+                deadline = now + rng.uniform(0, 10)
+                timers.schedule(key, deadline)
+                expected[key] = deadline
+            elif action < 0.8:
+                self.assertEqual(timers.cancel(key), expected.pop(key, None) is not None)
+            else:
+                now += rng.uniform(0, 3)
+                due = sorted((deadline, key) for key, deadline in expected.items()
+                             if deadline <= now)
+                self.assertEqual(timers.pop_due(now), [(key, deadline) for deadline, key in due])
+                for _, key in due:
+                    del expected[key]
+            self.assertEqual(len(timers), len(expected))
+            self.assertEqual(timers.next_deadline(), min(expected.values(), default=None))
+            self.assertLessEqual(timers._stale, max(len(expected), 64) + 1)
+
+if __name__ == "__main__":
+    unittest.main()
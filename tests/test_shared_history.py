@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+
+from shared_history import SharedPingHistory
+
+def _entry(i, success=True):
+    return {"timestamp": "2026-01-01 00:00:00", "success": success,
+            "status_code": 200 if success else 503, "response": str(i),
+            "error": None, "timings": {"total_ms": float(i)}}
+
+class SharedHistoryResizeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "history.bin")
+        self.writer = SharedPingHistory(self.path, 10)
+        self.reader = SharedPingHistory(self.path, 10)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _responses(self, history):
+        return [entry["response"] for entry in history]
+
+    def test_shrink_keeps_newest_and_remaps_other_processes(self):
+        for i in range(8):
+            self.writer.append(_entry(i))
+        dropped = self.writer.resize(5)
+        self.assertEqual([entry["response"] for entry in dropped], ["0", "1", "2"])
+        # The reader still maps the replaced file until its next access
+        self.assertEqual(len(self.reader), 5)
+        self.assertEqual(self.reader.capacity, 5)
+        self.assertEqual(self._responses(self.reader), ["3", "4", "5", "6", "7"])
+
+    def test_grow_keeps_sequence_numbers(self):
+        for i in range(12):
+            self.writer.append(_entry(i))
+        last_seq = self.writer.last_seq
+        self.reader.resize(20)
+        self.assertEqual(self.writer.last_seq, last_seq)
+        self.writer.append(_entry(12))
+        self.assertEqual(self._responses(self.reader)[-3:], ["10", "11", "12"])
+        self.assertEqual(len(self.reader), 11)
+
+    def test_stale_writer_appends_to_the_new_file(self):
+        for i in range(3):
+            self.writer.append(_entry(i))
+        self.reader.resize(4)
+        # The writer has not touched the file since; its write lock must
+        # notice the stale mapping instead of writing to the old file
+        self.writer.append(_entry(3))
+        self.writer.append(_entry(4))
+        self.assertEqual(self._responses(self.reader), ["1", "2", "3", "4"])
+        self.assertEqual(self.reader.since(self.reader.last_seq - 2)[-1]["response"], "4")
+
+    def test_header_state_survives_resize(self):
+        self.writer.stats.record(True, 60.0)
+        self.writer.stats.record(False, 60.0)
+        self.writer.set_paused(True)
+        self.writer.publish_config({"interval": 300})
+        self.writer.count_ping("success", 0.1)
+        version = self.reader.version
+        self.reader.resize(3)
+        self.assertGreater(self.writer.version, version)
+        self.assertTrue(self.writer.paused)
+        self.assertEqual(self.writer.read_config()[1]["interval"], 300)
+        self.assertEqual(self.writer.ping_counts()["outcomes"]["success"], 1)
+        self.assertEqual(self.writer.stats.snapshot(60.0)["all_time"]["count"], 2)
+
+    def test_reader_iterates_across_a_resize(self):
+        for i in range(10):
+            self.writer.append(_entry(i))
+        newest_first = reversed(self.reader)
+        self.assertEqual(next(newest_first)["response"], "9")
+        self.writer.resize(6)
+        # Entries still retained keep coming; dropped ones end the iteration
+        rest = [entry["response"] for entry in newest_first]
+        self.assertEqual(rest, ["8", "7", "6", "5", "4"])
+
+if __name__ == "__main__":
+    unittest.main()